@@ -0,0 +1,100 @@
+import sqlite3
+import hashlib
+import pickle
+import json
+import time
+
+"""
+Persistent cache of the results of the preprocessing instructions, stored in a sqlite file.
+
+The key of a result is a hash of the instructions of the stage (without their names, so EXTRACT_REGEX_PATTERN and
+EXTRACT_REGEX_PATTERN_1 with the same arguments share their results) and of the text of the cell. All the per-cell
+functions start with str(text), so the text is enough to identify the input of a cell.
+The results are pickled. When the file is bigger than max_size bytes, the results used the least recently are removed.
+CACHE_VERSION is part of the keys: it has to be changed when a function of preprocessing.py gives other results.
+
+Example Usage:
+new_df = preprocessing("instructions.json", df, cache="preprocessing_cache.sqlite")
+"""
+
+CACHE_VERSION = 5
+
+# number of keys in one sqlite query
+BATCH_SIZE = 500
+
+
+class PreprocessingCache:
+
+    def __init__(self, path, max_size=1000000000):
+        self.path = path
+        self.max_size = max_size
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, size INTEGER, last_used REAL)")
+        self.connection.commit()
+
+    # key of the instructions of a stage
+    def stage_key(self, instructions):
+        return json.dumps([CACHE_VERSION, [[instruction, dict_instruction] for name, instruction, dict_instruction in instructions]], sort_keys=True)
+
+    # key of the text of a cell for a stage
+    def cell_key(self, stage_key, text):
+        return hashlib.sha256((stage_key + "\0" + text).encode("utf-8", "surrogatepass")).hexdigest()
+
+    # return the results found in the cache for the keys in a dictionary key -> result
+    def get(self, keys):
+        found = {}
+        for i in range(0, len(keys), BATCH_SIZE):
+            batch = keys[i:i + BATCH_SIZE]
+            query = f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(batch))})"
+            for key, value in self.connection.execute(query, batch):
+                found[key] = pickle.loads(value)
+        if found:
+            now = time.time()
+            self.connection.executemany("UPDATE results SET last_used = ? WHERE key = ?", [(now, key) for key in found.keys()])
+            self.connection.commit()
+        return found
+
+    # add the results (dictionary key -> result) to the cache and remove the oldest ones if the cache is too big
+    def put(self, results):
+        now = time.time()
+        rows = []
+        for key, result in results.items():
+            value = pickle.dumps(result)
+            rows.append((key, value, len(value), now))
+        self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+        self.connection.commit()
+        self.evict()
+
+    # remove the results used the least recently until the size of the cache is under max_size
+    def evict(self):
+        size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if size <= self.max_size:
+            return
+        removed = []
+        for key, value_size in self.connection.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if size <= self.max_size:
+                break
+            removed.append((key,))
+            size -= value_size
+        self.connection.executemany("DELETE FROM results WHERE key = ?", removed)
+        self.connection.commit()
+
+    # return the results of a stage for lists of texts (one list per column). Only the texts that are not in the cache are
+    # given to compute, which returns their results in the same order
+    def map(self, instructions, texts_by_column, compute):
+        stage_key = self.stage_key(instructions)
+        keys_by_column = [[self.cell_key(stage_key, text) for text in texts] for texts in texts_by_column]
+        texts_by_key = {}
+        for texts, keys in zip(texts_by_column, keys_by_column):
+            texts_by_key.update(zip(keys, texts))
+
+        found = self.get(list(texts_by_key.keys()))
+        missing_keys = [key for key in texts_by_key.keys() if key not in found]
+        if missing_keys:
+            computed = dict(zip(missing_keys, compute([texts_by_key[key] for key in missing_keys])))
+            self.put(computed)
+            found.update(computed)
+        return [[found[key] for key in keys] for keys in keys_by_column]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,128 @@
+from check_instructions import check_instructions
+from preprocessing import dict_check_instructions, load_instructions, build_plans, target_columns, apply_plans, create_execution, close_execution
+
+"""
+Lazy version of the preprocessing function.
+
+Pipeline.from_json reads the instructions file and transform(df) returns a LazyFrame: nothing is applied until collect(),
+to_parquet() or the iteration over the LazyFrame. select(columns) and head(n) are applied before the instructions:
+- select: only the targets whose columns (or new columns of EXTRACT_REGEX_PATTERN) are needed by the selected columns are
+  processed. A target "ALL" needs all the columns.
+- head: only the first n rows are processed.
+The iteration returns the result by chunks of rows_per_chunk rows. REMOVE_FREQUENT and REMOVE_RARE count the words of all
+the rows: when the instructions selected contain one of them, head and the iteration process all the rows at once and keep
+the rows asked, so the result is the same as the rows of the whole preprocessing.
+
+Example Usage:
+pipeline = Pipeline.from_json("instructions.json", workers=4)
+new_df = pipeline.transform(df).select(["Review", "Rating"]).head(100).collect()
+"""
+
+
+# keep the targets of the plans needed to compute the columns, return the plans kept and the columns they read
+def prune_plans(plans, columns, df_columns):
+    needed = set(columns)
+    kept = []
+    for target, plan in reversed(plans):
+        if target == "ALL":
+            return plans, list(df_columns)
+        columns_read = target_columns(target, None)
+        columns_written = set(columns_read)
+        for stage in plan:
+            if stage["kind"] == "extract":
+                columns_written.update(stage["new_column_name"])
+        if columns_written & needed:
+            kept.insert(0, [target, plan])
+            needed.update(columns_read)
+    return kept, [column for column in df_columns if column in needed]
+
+
+class Pipeline:
+
+    def __init__(self, instructions_file, workers=1, chunksize=None, cache=None, dedup_ratio=0.5, optimize=False, verbose=True):
+        self.instructions_file = instructions_file
+        self.dict_json = load_instructions(instructions_file)
+        self.options = {"workers": workers, "chunksize": chunksize, "cache": cache, "dedup_ratio": dedup_ratio}
+        self.optimize = optimize
+        self.verbose = verbose
+
+    @classmethod
+    def from_json(cls, instructions_file, **options):
+        return cls(instructions_file, **options)
+
+    def transform(self, df):
+        # check the instructions
+        check_instructions(dict_check_instructions, self.instructions_file, df)
+        return LazyFrame(self, df)
+
+
+class LazyFrame:
+
+    def __init__(self, pipeline, df, columns=None, nb_rows=None):
+        self.pipeline = pipeline
+        self.df = df
+        self.columns = columns
+        self.nb_rows = nb_rows
+
+    def select(self, columns):
+        return LazyFrame(self.pipeline, self.df, list(columns), self.nb_rows)
+
+    def head(self, n=5):
+        nb_rows = n if self.nb_rows is None else min(n, self.nb_rows)
+        return LazyFrame(self.pipeline, self.df, self.columns, nb_rows)
+
+    # compile the plans needed by the selected columns, return them with the input dataframe (only the columns needed and
+    # the first nb_rows rows). REMOVE_FREQUENT and REMOVE_RARE count the words of all the rows: if only a part of the rows
+    # is processed at once (head or chunks), the plans are applied once to all the rows and the result is returned with
+    # None as plans
+    def prepare(self, execution, rows_per_chunk):
+        plans = build_plans(self.pipeline.dict_json, optimize=self.pipeline.optimize)
+        df_input = self.df
+        if self.columns is not None:
+            plans, columns_read = prune_plans(plans, self.columns, self.df.columns)
+            df_input = self.df[columns_read]
+
+        has_corpus = any(stage["kind"] == "corpus" for target, plan in plans for stage in plan)
+        if has_corpus and (self.nb_rows is not None or rows_per_chunk is not None):
+            df_copy = df_input.copy()
+            apply_plans(plans, df_copy, execution)
+            return None, df_copy if self.nb_rows is None else df_copy.head(self.nb_rows)
+        if self.nb_rows is not None:
+            df_input = df_input.head(self.nb_rows)
+        return plans, df_input
+
+    # keep the selected columns of the result
+    def output(self, df_copy):
+        if self.columns is None:
+            return df_copy
+        return df_copy[self.columns]
+
+    def collect(self):
+        execution = create_execution(nb_cells=len(self.df), verbose=self.pipeline.verbose, **self.pipeline.options)
+        try:
+            plans, df_copy = self.prepare(execution, None)
+            if plans is not None:
+                df_copy = df_copy.copy()
+                apply_plans(plans, df_copy, execution)
+        finally:
+            close_execution(execution)
+        return self.output(df_copy)
+
+    def to_parquet(self, path, **to_parquet_arguments):
+        self.collect().to_parquet(path, **to_parquet_arguments)
+
+    # apply the instructions by chunks of rows and return the chunks one by one
+    def iter_chunks(self, rows_per_chunk=10000):
+        execution = create_execution(nb_cells=rows_per_chunk, verbose=False, **self.pipeline.options)
+        try:
+            plans, df_input = self.prepare(execution, rows_per_chunk)
+            for i in range(0, len(df_input), rows_per_chunk):
+                chunk = df_input.iloc[i:i + rows_per_chunk].copy()
+                if plans is not None:
+                    apply_plans(plans, chunk, execution)
+                yield self.output(chunk)
+        finally:
+            close_execution(execution)
+
+    def __iter__(self):
+        return self.iter_chunks()
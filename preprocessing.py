@@ -4,18 +4,39 @@ import string
 import re
 import json
 import datetime
+import math
+import hashlib
+import os
+import sys
+import io
+import contextlib
+import warnings
 from collections import OrderedDict
+from functools import lru_cache
 from check_instructions import check_instructions
+from cache import PreprocessingCache
+from profiler import Profiler
+from spelling import SymSpellChecker
+from sketches import MisraGries, CountMinSketch
+from translation import CharacterTable
 from nltk.corpus import stopwords
 from collections import Counter
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
 from nltk.stem.snowball import SnowballStemmer
 from nltk.stem import WordNetLemmatizer
 from nltk.corpus import wordnet
+from nltk.corpus.reader.wordnet import NOUN, VERB, ADV, ADJ
 from utils import emoticons
 from utils import emojis_unicode
 from utils import slang_words
 from spellchecker import SpellChecker
 from dateutil import parser
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # before pandas 2.2 the function is not public
+    from pandas._libs.tslibs.parsing import guess_datetime_format
 
 #-------------------------------------------------------------Instructions--------------------------------------------------------------
 """
@@ -30,10 +51,10 @@ Here are the instructions that you can use and their arguments:
 LOWERCASE: lowercases the text (no argument)
 REMOVE_PUNCT: removes punctuation (takes an optional argument punctuation which is a string containing the punctuation to remove. In case no argument is given, the function removes all the punctuation)
 REMOVE_STOPWORDS: removes stopwords (takes an optional argument language which is a string containing the language of the stopwords to remove. In case no argument is given, the function removes english stopwords)
-REMOVE_FREQUENT: removes the most frequent words (takes one or two arguments. The argument nb_words is mandatory and is the number of most frequent words to remove. The argument apply is optional and is a string containing -e if you want to apply the removal of the frequent words. If there is no argument apply, the function only prints the number of most frequent words indicated in the argument nb_words without removing them)
-REMOVE_RARE: removes the most rare words (takes one or two arguments. The argument nb_words is mandatory and is the number of most rare words to remove. The argument apply is optional and is a string containing -e if you want to apply the removal of the rare words. If there is no argument apply, the function only prints the number of most rare words indicated in the argument nb_words without removing them)
+REMOVE_FREQUENT: removes the most frequent words (takes one or two arguments. The argument nb_words is mandatory and is the number of most frequent words to remove. The argument apply is optional and is a string containing -e if you want to apply the removal of the frequent words. If there is no argument apply, the function only prints the number of most frequent words indicated in the argument nb_words without removing them. In this case, the argument mode can be approximate to count the words with a fixed memory (see sketches.py) instead of exact, the default. The argument sketch_size is the number of words kept by the approximate count, 100000 by default)
+REMOVE_RARE: removes the most rare words (takes one or two arguments. The argument nb_words is mandatory and is the number of most rare words to remove. The argument apply is optional and is a string containing -e if you want to apply the removal of the rare words. If there is no argument apply, the function only prints the number of most rare words indicated in the argument nb_words without removing them. In this case, the argument mode can be approximate to count the words with a fixed memory (see sketches.py) instead of exact, the default. The argument sketch_size is the number of words kept by the approximate count, 100000 by default)
 STEM: stems the words (takes an optional argument language which is a string containing the language of the words to stem. In case no argument is given, the function stems english words)
-LEMMATIZE_ENGLISH: lemmatizes the words (no argument)
+LEMMATIZE_ENGLISH: lemmatizes the words (takes an optional argument mode which is a string containing accurate or fast. In case no argument is given, the mode is accurate: the POS of the words are tagged before the lemmatization. The fast mode doesn't tag the POS: the words separated by spaces are lemmatized as nouns, then as verbs if they are not nouns. It is much faster but less accurate. The argument tokenizer is a string containing nltk, regex or whitespace and tells how the text is split into words before the POS tagging in accurate mode. In case no argument is given, nltk.word_tokenize is used, except for the texts without punctuation (ex: after REMOVE_PUNCT) which are split on whitespace with the same result. regex and whitespace are faster but can split the texts with punctuation differently, compare_tokenizers shows the texts where they differ from word_tokenize)
 REMOVE_EMOJI: removes emojis (no argument)
 REMOVE_EMOTICONS: removes emoticons (no argument)
 CONVERT_EMOJIS: converts emojis to words (no argument)
@@ -41,8 +62,8 @@ CONVERT_EMOTICONS: converts emoticons to words (no argument)
 REMOVE_URLS: removes urls (no argument)
 REMOVE_HTML: removes html (no argument)
 CHAT_WORDS_CONVERSION: converts chat words to words (no argument)
-SPELL_CORRECTION: corrects spelling (no argument)
-CONVERT_TO_DATE_OR_DATETIME: converts the text to date or datetime (no argument)
+SPELL_CORRECTION: corrects spelling (takes two optional arguments. The argument method is a string containing pyspellchecker (default) or symspell. symspell gives almost the same corrections much faster with an index of the dictionary (see spelling.py). The argument index_file is the path of the file where the index is saved to be built only once, by default in the cache directory of the user (see spelling.py))
+CONVERT_TO_DATE_OR_DATETIME: converts the text to date or datetime (takes an optional argument format which is a string containing the format of the dates, ex: "%m/%d/%Y %H:%M". In case no argument is given, the format is guessed from the first distinct texts of the column and kept only if it gives the same dates as dateutil. The texts are parsed all at once by pandas with the format, the ones that don't match it are parsed by dateutil)
 EXTRACT_REGEX_PATTERN: extracts a regex pattern (takes one to four arguments. The argument regex_pattern is mandatory and is the regex pattern to extract. The argument secondary_regex_pattern is optional and is the secondary regex pattern to extract in the first regex_pattern. The argument new_column_name is optional and is the name of the new column(s) that will contain the result of the extraction. If there is no argument new_column_name the result will replace the column(s) that was(were) extracted. The argument result_type is optional and is the type of the result of the extraction. If there is no argument result_type, the result is a list.)
 
 It's possible to use multiple times the same instruction on the same object if you put "_{number}" at the end of the instruction. For example, if you want to apply the instruction EXTRACT_REGEX_PATTERN twice, you can write EXTRACT_REGEX_PATTERN and EXTRACT_REGEX_PATTERN_1.
@@ -56,7 +77,7 @@ structure of the instructions with all the arguments in the json file:
     "REMOVE_FREQUENT": {"nb_words": 10, "apply": "-e"},
     "REMOVE_RARE": {"nb_words": 10, "apply": "-e"},
     "STEM": {"language": "english"},
-    "LEMMATIZE_ENGLISH": {},
+    "LEMMATIZE_ENGLISH": {"mode": "fast"},
     "REMOVE_EMOJI": {},
     "REMOVE_EMOTICONS": {},
     "CONVERT_EMOJIS": {},
@@ -64,8 +85,8 @@ structure of the instructions with all the arguments in the json file:
     "REMOVE_URLS": {},
     "REMOVE_HTML": {},
     "CHAT_WORDS_CONVERSION": {},
-    "SPELL_CORRECTION": {},
-    "CONVERT_TO_DATE_OR_DATETIME": {},
+    "SPELL_CORRECTION": {"method": "symspell", "index_file": "spell_index.pkl"},
+    "CONVERT_TO_DATE_OR_DATETIME": {"format": "%m/%d/%Y %H:%M"},
     "EXTRACT_REGEX_PATTERN": {"regex_pattern": "regex", "secondary_regex_pattern": "regex", "new_column_name": "new_column", "result_type": "str"}
 }
 }
@@ -76,10 +97,10 @@ structure of the instructions with all the arguments in the json file:
 dict_check_instructions = {"LOWERCASE": {},
                             "REMOVE_PUNCT": {"punctuation": ["str"]},
                             "REMOVE_STOPWORDS": {"language": ["str_inlist", stopwords.fileids()]},
-                            "REMOVE_FREQUENT": {"nb_words": ["int", "mandatory"], "apply": ["str_inlist", ["-e"]]},
-                            "REMOVE_RARE": {"nb_words": ["int", "mandatory"], "apply": ["str_inlist", ["-e"]]},
+                            "REMOVE_FREQUENT": {"nb_words": ["int", "mandatory"], "apply": ["str_inlist", ["-e"]], "mode": ["str_inlist", ["exact", "approximate"]], "sketch_size": ["int"]},
+                            "REMOVE_RARE": {"nb_words": ["int", "mandatory"], "apply": ["str_inlist", ["-e"]], "mode": ["str_inlist", ["exact", "approximate"]], "sketch_size": ["int"]},
                             "STEM": {"language": ["str_inlist", SnowballStemmer.languages]},
-                            "LEMMATIZE_ENGLISH": {},
+                            "LEMMATIZE_ENGLISH": {"mode": ["str_inlist", ["accurate", "fast"]], "tokenizer": ["str_inlist", ["nltk", "regex", "whitespace"]]},
                             "REMOVE_EMOJI": {},
                             "REMOVE_EMOTICONS": {},
                             "CONVERT_EMOJIS": {},
@@ -87,8 +108,8 @@ dict_check_instructions = {"LOWERCASE": {},
                             "REMOVE_URLS": {},
                             "REMOVE_HTML": {},
                             "CHAT_WORDS_CONVERSION": {},
-                            "SPELL_CORRECTION": {},
-                            "CONVERT_TO_DATE_OR_DATETIME": {},
+                            "SPELL_CORRECTION": {"method": ["str_inlist", ["pyspellchecker", "symspell"]], "index_file": ["str"]},
+                            "CONVERT_TO_DATE_OR_DATETIME": {"format": ["str"]},
                             "EXTRACT_REGEX_PATTERN": {"regex_pattern": ["str", "mandatory"], "secondary_regex_pattern": ["str"],  "new_column_name": ["list"], "result_type": ["str_inlist", ["list", "str", "int", "float", "date", "datetime"]]}
                             }
 
@@ -109,44 +130,142 @@ def remove_punctuation(text, punctuation):
 def remove_stopwords(text, STOPWORDS):
     text = str(text)
     text_split = text.split(' ')
-    text_filtered =  [word for word in text_split if word   not in STOPWORDS]
+    text_filtered = remove_stopwords_tokens(text_split, STOPWORDS)
     text_filtered = " ".join(text_filtered)
     return text_filtered
 
+# remove stopwords from a list of words
+def remove_stopwords_tokens(tokens, STOPWORDS):
+    return [word for word in tokens if word not in STOPWORDS]
+
 # remove frequent words or rare words depending on the argument freq_words
 def remove_freq_or_rare_words(text, freq_words):
     text = str(text)
     text_removed = " ".join([word for word in text.split(" ") if word not in freq_words])
     return text_removed
 
+# stemmers already created for each language
+stemmers = {}
+
 # stem the words according to the language given in argument
 def stem_words(text, language):
     text = str(text)
-    stemmer = SnowballStemmer(language)
-    text_stemmed = " ".join([stemmer.stem(word) for word in text.split(" ")])
+    if language not in stemmers:
+        stemmers[language] = SnowballStemmer(language)
+    stemmer = stemmers[language]
+    text_stemmed = " ".join(stem_tokens(text.split(" "), stemmer))
     return text_stemmed
 
+# stem a list of words with the stemmer given in argument
+def stem_tokens(tokens, stemmer):
+    return [stemmer.stem(word) for word in tokens]
+
+# lemmatizer and wordnet POS of the first letter of the POS tags, created once for all the cells (the POS are imported
+# from the wordnet reader, so wordnet is not loaded before the first lemmatization)
+lemmatizer = WordNetLemmatizer()
+wordnet_map = {
+    'N': NOUN,
+    'V': VERB,
+    'R': ADV,
+    'J': ADJ
+}
+
+# number of (word, POS) whose lemma is kept in memory
+LEMMA_CACHE_SIZE = 100000
+
+# lemmatize a word with its wordnet POS, the same pairs come back very often so the last lemmas are kept
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_word(word, pos):
+    return lemmatizer.lemmatize(word, pos=pos)
+
+# nltk resources already downloaded (or tried) by this process, the plans ask for them once per function built
+downloaded_resources = set()
+
+# download a resource of nltk once per process
+def download_resource(resource):
+    if resource not in downloaded_resources:
+        nltk.download(resource, quiet=True)
+        downloaded_resources.add(resource)
+
+# download the resources of the lemmatization and load wordnet, so the first cells don't pay for it. The fast mode
+# doesn't need the tokenizer and the POS tagger, only the nltk tokenizer needs punkt
+def prepare_lemmatizer(mode="accurate", tokenizer="nltk"):
+    download_resource('wordnet')
+    if mode == "accurate":
+        download_resource('averaged_perceptron_tagger')
+    if mode == "accurate" and tokenizer == "nltk":
+        download_resource('punkt')
+    wordnet.ensure_loaded()
+    lemmatize_word("words", NOUN)
+
+# characters that nltk.word_tokenize splits from the words or changes (punctuation, quotes and dashes) and words that it
+# splits in two (ex: cannot -> can not). A text without them is only split on whitespace by word_tokenize
+tokenizer_characters = set(string.punctuation + "\u00ab\u00bb\u201c\u201d\u2018\u2019\u201e\u2012\u2013\u2014\u2015")
+tokenizer_words_pattern = re.compile(r"(?i)cannot|gimme|gonna|gotta|lemme|wanna")
+# words (with the contractions split like word_tokenize: do n't, it 's), numbers with their decimal separators and
+# punctuation characters
+regex_tokenizer_pattern = re.compile(r"\w+(?=n't\b)|n't\b|'\w+|\w+(?:[.,]\d+)*|[^\w\s]")
+
+# check if nltk.word_tokenize only splits a text on whitespace (ex: the text went through REMOVE_PUNCT)
+def is_whitespace_text(text):
+    return tokenizer_characters.isdisjoint(text) and tokenizer_words_pattern.search(text) is None
+
+# split a text into words for the POS tagger. The texts that word_tokenize only splits on whitespace are split with
+# str.split by all the tokenizers. For the others, "nltk" calls word_tokenize (sentence splitter and treebank regexes),
+# "regex" uses one compiled regex and "whitespace" str.split: they are faster but don't give the same words as
+# word_tokenize on all the texts (see compare_tokenizers)
+def tokenize_text(text, tokenizer="nltk"):
+    if tokenizer == "whitespace" or is_whitespace_text(text):
+        return text.split()
+    elif tokenizer == "regex":
+        return regex_tokenizer_pattern.findall(text)
+    else:
+        return nltk.tokenize.word_tokenize(text)
+
+# compare a tokenizer with nltk.word_tokenize on texts (ex: the reviews after the instructions applied before
+# LEMMATIZE_ENGLISH), return the texts that don't get the same words with both
+def compare_tokenizers(texts, tokenizer="regex"):
+    differences = []
+    for text in texts:
+        text = str(text)
+        expected_words = nltk.tokenize.word_tokenize(text)
+        words = tokenize_text(text, tokenizer)
+        if words != expected_words:
+            differences.append([text, expected_words, words])
+    return pd.DataFrame(differences, columns=["text", "word_tokenize", tokenizer])
+
 # lemmatize the words in english
-def lemmatize_words_eng(text):
-    text = str(text)
+def lemmatize_words_eng(text, tokenizer="nltk"):
+    return lemmatize_texts_eng([text], tokenizer)[0]
 
-    lemmatizer = WordNetLemmatizer()
-    wordnet_map = {
-        'N': wordnet.NOUN,
-        'V': wordnet.VERB,
-        'R': wordnet.ADV,
-        'J': wordnet.ADJ
-    }
+# lemmatize the words of several texts in english, the POS tagger is loaded once for all the texts
+def lemmatize_texts_eng(texts, tokenizer="nltk"):
+    pos_tagged_texts = nltk.pos_tag_sents([tokenize_text(str(text), tokenizer) for text in texts])
+    lemmatized_texts = []
+    for pos_tagged_text in pos_tagged_texts:
+        lemmatized_words = [lemmatize_word(words, wordnet_map.get(pos[0], NOUN)) for words, pos in pos_tagged_text]
+        lemmatized_texts.append(' '.join(lemmatized_words))
+    return lemmatized_texts
 
-    pos_tagged_text = nltk.pos_tag(nltk.tokenize.word_tokenize(text))
-    lemmatized_words = [lemmatizer.lemmatize(words, pos = wordnet_map.get(pos[0], wordnet.NOUN)) for words, pos in pos_tagged_text ]
-    lemmatized_text = ' '.join(lemmatized_words)
-    return lemmatized_text
+# lemmatize a word without its POS: as a noun, then as a verb if the word is not a known noun form
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_word_fast(word):
+    lemma = lemmatize_word(word, NOUN)
+    if lemma == word:
+        lemma = lemmatize_word(word, VERB)
+    return lemma
 
-# remove emojis
-def remove_emoji(text):
+# lemmatize the words in english without the POS tagger (fast mode)
+def lemmatize_words_eng_fast(text):
     text = str(text)
-    emoji_pattern = re.compile("[" 
+    return " ".join(lemmatize_tokens_fast(text.split(" ")))
+
+# lemmatize a list of words without the POS tagger
+def lemmatize_tokens_fast(tokens):
+    return [lemmatize_word_fast(word) for word in tokens]
+
+# regex patterns compiled once for all the cells
+emoji_pattern = re.compile("[" 
                            u"\U0001F600-\U0001F64F"  # emoticons
                            u"\U0001F300-\U0001F5FF"  # symbols & pictographs
                            u"\U0001F680-\U0001F6FF"  # transport & map symbols
@@ -154,96 +273,241 @@ def remove_emoji(text):
                            u"\U00002702-\U000027B0"  # Miscellaneous symbols
                            u"\U000024C2-\U0001F251"  # Enclosed characters
                            "]+", flags=re.UNICODE)   # '+' signifies that those characters can occur once or more consecutively
+url_pattern = re.compile(r'https?://\S+|www\.\S+')
+html_pattern = re.compile('<.*?>')
 
+# remove emojis
+def remove_emoji(text):
+    text = str(text)
     text_no_emoji = re.sub(emoji_pattern, '', text)
     return text_no_emoji
 
+# emoticons written by a key of EMOTICONS. The keys are written as regular expressions (":\\)"): the backslashes are
+# removed and the character classes give one emoticon per character (":[(\\\\)]" -> ":(", ":\\", ":)")
+def expand_emoticon(key):
+    texts = [""]
+    position = 0
+    while position < len(key):
+        if key[position] == "\\" and position + 1 < len(key):
+            characters = [key[position + 1]]
+            position += 2
+        elif key[position] == "[" and "]" in key[position + 1:]:
+            end = key.index("]", position + 1)
+            characters = list(dict.fromkeys(re.sub(r'\\(.)', r'\1', key[position + 1:end])))
+            position = end + 1
+        else:
+            characters = [key[position]]
+            position += 1
+        texts = [text + character for text in texts for character in characters]
+    return texts
+
+# emoticons written as they appear in a text -> description converted to words. The first description of an emoticon
+# written several times in the dictionary is kept
+def build_emoticon_descriptions():
+    descriptions = {}
+    for key, description in emoticons().items():
+        description = description.replace(",", "").split(" ")
+        for emoticon in expand_emoticon(key):
+            descriptions.setdefault(emoticon, "_".join(description))
+    return descriptions
+
+emoticon_descriptions = build_emoticon_descriptions()
+# one pattern for all the emoticons, built once and shared by REMOVE_EMOTICONS and CONVERT_EMOTICONS. The emoticons are
+# escaped and the longest ones are first, so ":-))" is matched as a whole and not as ":-)" followed by ")"
+emoticon_pattern = re.compile('|'.join(re.escape(emoticon) for emoticon in sorted(emoticon_descriptions, key=len, reverse=True)))
+
 # remove emoticons
 def remove_emoticons(text):
     text = str(text)
-    EMOTICONS = emoticons()
-    emoticon_pattern = re.compile(u'(' + u'|'.join(k for k in EMOTICONS) + u')')
     return emoticon_pattern.sub(r'', text)
 
-# convert emojis to words
-def convert_emojis(text):
-    text = str(text)
-    EMO_UNICODE = emojis_unicode()
-    for description, emoji in EMO_UNICODE.items():
+# trie of the emojis built once: each node is a dictionary character -> node and the node of the last character of an
+# emoji contains its description (already converted to words) under the key None
+def build_emoji_trie():
+    trie = {}
+    for description, emoji in emojis_unicode().items():
         description = description.replace(":", "")
         description = description.replace(",", "").split(" ")
         description = "_".join(description)
-        text = text.replace(emoji, description)
-    return text
+        node = trie
+        for character in emoji:
+            node = node.setdefault(character, {})
+        # the first description of an emoji written several times in the dictionary is kept
+        node.setdefault(None, description)
+    return trie
+
+emoji_trie = build_emoji_trie()
+# characters that can start an emoji, to jump directly to the positions where an emoji can be found
+emoji_start_pattern = re.compile("[" + "".join(re.escape(character) for character in emoji_trie.keys()) + "]")
+
+# convert emojis to words in one scan of the text. At each position the longest emoji is converted, so the sequences of
+# several characters (flags, keycaps, ZWJ sequences like family emojis) are converted as a whole
+def convert_emojis(text):
+    text = str(text)
+    pieces = []
+    position = 0
+    for match in emoji_start_pattern.finditer(text):
+        start = match.start()
+        if start < position:
+            continue
+        node = emoji_trie
+        description = None
+        i = start
+        while i < len(text) and text[i] in node:
+            node = node[text[i]]
+            i += 1
+            if None in node:
+                description, end = node[None], i
+        if description is not None:
+            pieces.append(text[position:start])
+            pieces.append(description)
+            position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
 
 # convert emoticons to words
 def convert_emoticons(text):
     text = str(text)
-    EMOTICONS = emoticons()
-    for emoticon, description in EMOTICONS.items():
-        description = description.replace(",", "").split(" ")
-        description = "_".join(description)
-        text = re.sub(emoticon, description, text)
-    return text
+    return emoticon_pattern.sub(lambda match: emoticon_descriptions[match.group()], text)
 
 # remove urls
 def remove_urls(text):
     text = str(text)
-    url_pattern = re.compile(r'https?://\S+|www\.\S+')
     return url_pattern.sub(r'', text)
 
 # remove html
 def remove_html(text):
     text = str(text)
-    html_pattern = re.compile('<.*?>')
     return html_pattern.sub(r'', text)
 
 # convert chat words to words
 def chat_words_conversion(text):
     text = str(text)
+    new_text = " ".join(chat_words_tokens(text.split(" ")))
+    return new_text
+
+# convert chat words to words in a list of words, the conversions of several words are split so the list stays a list of words
+def chat_words_tokens(tokens):
     slang_words_list = slang_words()
-    chat_words_list = list(slang_words_list.keys())
-    new_text = []
-    for word in text.split(" "):
-        if word.upper() in chat_words_list:
-            new_text.append(slang_words_list[word.upper()])
+    new_tokens = []
+    for word in tokens:
+        if word.upper() in slang_words_list:
+            new_tokens.extend(slang_words_list[word.upper()].split(" "))
         else:
-            new_text.append(word)   
-    new_text = " ".join(new_text)
-    return new_text
+            new_tokens.append(word)
+    return new_tokens
 
-# correct spelling mistakes
-def correct_spellings(text):
+# spell checkers already created, the keys are the method and the index file
+spell_checkers = {}
+
+# return the spell checker of the method given in argument: pyspellchecker or the symmetric delete index of spelling.py
+def spell_checker(method, index_file):
+    if (method, index_file) not in spell_checkers:
+        if method == "symspell":
+            spell_checkers[(method, index_file)] = SymSpellChecker.load_or_build(index_file)
+        else:
+            spell_checkers[(method, index_file)] = SpellChecker()
+    return spell_checkers[(method, index_file)]
+
+# correct spelling mistakes with the spell checker given in argument
+def correct_spellings(text, spell):
     text = str(text)
-    spell = SpellChecker()
-    corrected_text = []
-    misspelled = spell.unknown(text.split(" "))
-    for word in text.split(" "):
+    corrected_text = " ".join(correct_spellings_tokens(text.split(" "), spell))
+    return corrected_text
+
+# correct spelling mistakes in a list of words with the spell checker given in argument
+def correct_spellings_tokens(tokens, spell):
+    corrected_tokens = []
+    misspelled = spell.unknown(tokens)
+    for word in tokens:
         if word == " ":
             continue
         if word in misspelled:
-            if spell.correction(word) == None:
-                corrected_text.append(word)
+            correction = spell.correction(word)
+            if correction == None:
+                corrected_tokens.append(word)
             else:
-                corrected_text.append(spell.correction(word))
+                corrected_tokens.append(correction)
         else:
-            corrected_text.append(word)
-    corrected_text = " ".join(corrected_text)
-    return corrected_text
+            corrected_tokens.append(word)
+    return corrected_tokens
+
+# number of texts whose date is kept in memory
+DATE_CACHE_SIZE = 100000
+
+# parse a date with dateutil, the same texts come back very often (ex: the Time column) so the last dates are kept
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(text):
+    return parser.parse(text, fuzzy=True)
+
+# return the date if the time is midnight, the datetime otherwise
+def date_or_datetime(datetime_obj):
+    if datetime_obj.time() != datetime.time(0):
+        return datetime_obj
+    else:
+        return datetime_obj.date()
 
 # convert to date or datetime
 def convert_to_date_or_datetime(text):
     text = str(text)
     try:
-        datetime_obj = parser.parse(text, fuzzy=True)
-        if datetime_obj.time() != datetime.time(0):
-            return datetime_obj
-        else:
-            return datetime_obj.date()
+        return date_or_datetime(parse_date(text))
     except ValueError:
         return None
 
-# extract regex pattern
+# guess the format of the dates from the first distinct texts. The format is kept only if it gives the same dates as
+# dateutil on these texts. The formats with a 2 digits year or a time zone are not used, dateutil handles them differently
+def infer_date_format(texts, sample_size=100):
+    sample = list(dict.fromkeys(texts))[:sample_size]
+    # pandas warns when it guesses a format with the day first, the format is checked with dateutil below
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        formats = Counter(guess_datetime_format(text) for text in sample)
+    for date_format, count in formats.most_common():
+        if date_format is None or "%y" in date_format or "%z" in date_format or "%Z" in date_format:
+            continue
+        timestamps = pd.to_datetime(pd.Series(sample, dtype=object), format=date_format, errors="coerce")
+        if all(pd.isna(timestamp) or timestamp.to_pydatetime() == parse_date(text) for text, timestamp in zip(sample, timestamps)):
+            return date_format
+    return None
+
+# check if a date read with a format with the day before the month (as numbers) could be read with them swapped (both up
+# to 12). dateutil reads the month first, like the formats with the month before the day
+def is_ambiguous_date(date_format, timestamp):
+    if "%d" not in date_format or "%m" not in date_format or date_format.index("%m") < date_format.index("%d"):
+        return False
+    return timestamp.day <= 12 and timestamp.day != timestamp.month
+
+# convert a list of texts to dates or datetimes. The texts are parsed together by pandas with the format (given or guessed),
+# the ones that don't match the format are parsed one by one by dateutil. A guessed format is only checked on the first
+# texts, so the texts where the day and the month could be swapped are also parsed by dateutil (month first): the result
+# of a text doesn't depend on the other texts of the list
+def convert_to_date_or_datetime_texts(texts, date_format=None):
+    texts = [str(text) for text in texts]
+    guessed = date_format is None
+    if guessed:
+        date_format = infer_date_format(texts)
+    if date_format is None:
+        return [convert_to_date_or_datetime(text) for text in texts]
+
+    timestamps = pd.to_datetime(pd.Series(texts, dtype=object), format=date_format, errors="coerce")
+    results = []
+    for text, timestamp in zip(texts, timestamps):
+        if pd.isna(timestamp) or (guessed and is_ambiguous_date(date_format, timestamp)):
+            results.append(convert_to_date_or_datetime(text))
+        else:
+            results.append(date_or_datetime(timestamp.to_pydatetime()))
+    return results
+
+# convert a text to date or datetime with a format, with dateutil if the text doesn't match the format
+def convert_to_date_or_datetime_format(text, date_format):
+    text = str(text)
+    try:
+        return date_or_datetime(datetime.datetime.strptime(text, date_format))
+    except ValueError:
+        return convert_to_date_or_datetime(text)
+
+# extract regex pattern, the patterns can be strings or compiled patterns
 def extract_regex_pattern(text, regex_pattern, secondary_regex_pattern, result_type):
     text = str(text)
     primary_matches = re.findall(regex_pattern, text)
@@ -276,14 +540,14 @@ def extract_regex_pattern(text, regex_pattern, secondary_regex_pattern, result_t
         elif result_type == "float":
             return float(result[0])
         elif result_type == "date":
-            return parser.parse(result[0], fuzzy=True).date()
+            return parse_date(result[0]).date()
         elif result_type == "datetime":
-            return parser.parse(result[0], fuzzy=True)
+            return parse_date(result[0])
         else:
             return result
 
 
-#-------------------------------------------------------------Preprocessing-------------------------------------------------------------
+#------------------------------------------------------------Execution plan-------------------------------------------------------------
 instructions_without_argument = {
     "LOWERCASE": lowercase,
     "REMOVE_EMOJI": remove_emoji,
@@ -292,122 +556,1214 @@ instructions_without_argument = {
     "CONVERT_EMOTICONS": convert_emoticons,
     "REMOVE_URLS": remove_urls,
     "REMOVE_HTML": remove_html,
-    "CHAT_WORDS_CONVERSION": chat_words_conversion,
-    "SPELL_CORRECTION": correct_spellings,
-    "CONVERT_TO_DATE_OR_DATETIME": convert_to_date_or_datetime
+    "CHAT_WORDS_CONVERSION": chat_words_conversion
 }
 
-def preprocessing(instructions_file, df):
+# instructions applied to the cells (the others are REMOVE_FREQUENT and REMOVE_RARE, see corpus_instructions)
+cell_instructions = ["REMOVE_PUNCT", "REMOVE_STOPWORDS", "LEMMATIZE_ENGLISH", "STEM", "SPELL_CORRECTION", "CONVERT_TO_DATE_OR_DATETIME",
+                     "EXTRACT_REGEX_PATTERN"] + list(instructions_without_argument.keys())
 
-    # check the instructions
-    check_instructions(dict_check_instructions, instructions_file, df)  
+# return the name of the instruction without the "_{number}" suffix (ex: EXTRACT_REGEX_PATTERN_1 -> EXTRACT_REGEX_PATTERN)
+def base_instruction(instruction):
+    if instruction not in dict_check_instructions.keys():
+        return instruction[:-2]
+    return instruction
 
-    df_copy = df.copy()
-    
-    with open(instructions_file, 'r') as json_file:
-        dict_json = json.load(json_file, object_pairs_hook=OrderedDict)
-    # browse through the names of columns to preprocess
-    for target, value in dict_json.items():
-        if target == "ALL":
-            columns_to_process = df_copy.columns
-        elif target.startswith("COLUMNS"):
-            list_columns = target.split(";")[1:]
-            columns_to_process = list_columns
+# return the columns targeted by a key of the json file
+def target_columns(target, df):
+    if target == "ALL":
+        return df.columns
+    elif target.startswith("COLUMNS"):
+        return target.split(";")[1:]
+    else:
+        return [target]
+
+# return the per-cell function of an instruction with its arguments already bound
+def cell_function(instruction, dict_instruction):
+    # removing punctuation
+    if instruction == "REMOVE_PUNCT":
+        punctuation = dict_instruction.get("punctuation", string.punctuation)
+        return lambda line: remove_punctuation(line, punctuation)
+    # removing stopwords
+    elif instruction == "REMOVE_STOPWORDS":
+        download_resource('stopwords')
+        STOPWORDS = set(stopwords.words(dict_instruction.get("language", "english")))
+        return lambda line: remove_stopwords(line, STOPWORDS)
+    # lemmatize_english
+    elif instruction == "LEMMATIZE_ENGLISH":
+        mode = dict_instruction.get("mode", "accurate")
+        tokenizer = dict_instruction.get("tokenizer", "nltk")
+        prepare_lemmatizer(mode, tokenizer)
+        if mode == "fast":
+            return lemmatize_words_eng_fast
+        return lambda line: lemmatize_words_eng(line, tokenizer)
+    # stemming
+    elif instruction == "STEM":
+        language = dict_instruction.get("language", "english")
+        return lambda line: stem_words(line, language)
+    # spelling correction
+    elif instruction == "SPELL_CORRECTION":
+        spell = spell_checker(dict_instruction.get("method", "pyspellchecker"), dict_instruction.get("index_file", None))
+        return lambda line: correct_spellings(line, spell)
+    # convert to date or datetime
+    elif instruction == "CONVERT_TO_DATE_OR_DATETIME":
+        date_format = dict_instruction.get("format", None)
+        if date_format is None:
+            return convert_to_date_or_datetime
+        return lambda line: convert_to_date_or_datetime_format(line, date_format)
+    # extract regex pattern
+    elif instruction == "EXTRACT_REGEX_PATTERN":
+        regex_pattern = re.compile(dict_instruction["regex_pattern"])
+        secondary_regex_pattern = dict_instruction.get("secondary_regex_pattern", None)
+        if secondary_regex_pattern:
+            secondary_regex_pattern = re.compile(secondary_regex_pattern)
+        result_type = dict_instruction.get("result_type", "list")
+        return lambda line: extract_regex_pattern(line, regex_pattern, secondary_regex_pattern, result_type)
+    # functions without additional argument
+    elif instruction in instructions_without_argument.keys():
+        return instructions_without_argument[instruction]
+    # instruction not supported
+    else:
+        return None
+
+# return the function applied to the list of words of a cell for the instructions that split the text on spaces, None otherwise
+def token_function(instruction, dict_instruction):
+    if instruction == "REMOVE_STOPWORDS":
+        download_resource('stopwords')
+        STOPWORDS = set(stopwords.words(dict_instruction.get("language", "english")))
+        return lambda tokens: remove_stopwords_tokens(tokens, STOPWORDS)
+    elif instruction == "STEM":
+        stemmer = SnowballStemmer(dict_instruction.get("language", "english"))
+        return lambda tokens: stem_tokens(tokens, stemmer)
+    elif instruction == "CHAT_WORDS_CONVERSION":
+        return chat_words_tokens
+    elif instruction == "SPELL_CORRECTION":
+        spell = spell_checker(dict_instruction.get("method", "pyspellchecker"), dict_instruction.get("index_file", None))
+        return lambda tokens: correct_spellings_tokens(tokens, spell)
+    elif instruction == "LEMMATIZE_ENGLISH" and dict_instruction.get("mode", "accurate") == "fast":
+        prepare_lemmatizer("fast")
+        return lemmatize_tokens_fast
+    else:
+        return None
+
+# return the function applied to a list of cells for the instructions that are faster on many cells at once, None otherwise
+def batch_function(instruction, dict_instruction):
+    if not is_batch_instruction(instruction, dict_instruction):
+        return None
+    elif instruction == "LEMMATIZE_ENGLISH":
+        tokenizer = dict_instruction.get("tokenizer", "nltk")
+        prepare_lemmatizer("accurate", tokenizer)
+        return lambda texts: lemmatize_texts_eng(texts, tokenizer)
+    else:
+        date_format = dict_instruction.get("format", None)
+        return lambda values: convert_to_date_or_datetime_texts(values, date_format)
+
+# check if an instruction is applied to lists of cells: LEMMATIZE_ENGLISH tags the POS of all the cells at once, except in
+# fast mode where it works on words, and CONVERT_TO_DATE_OR_DATETIME parses all the cells with the same format
+def is_batch_instruction(instruction, dict_instruction):
+    if instruction == "LEMMATIZE_ENGLISH":
+        return dict_instruction.get("mode", "accurate") == "accurate"
+    return instruction == "CONVERT_TO_DATE_OR_DATETIME"
+
+# apply a per-cell function to a list of cells
+def values_function(function):
+    return lambda values: [function(value) for value in values]
+
+# split the text of a cell once, apply the token functions one after the other and join the words only at the end
+def tokens_function(token_functions):
+    def apply_tokens(line):
+        tokens = str(line).split(" ")
+        for function in token_functions:
+            tokens = function(tokens)
+        return " ".join(tokens)
+    return apply_tokens
+
+# compose several per-cell functions into one function applied in a single pass
+def compose(functions):
+    if len(functions) == 1:
+        return functions[0]
+
+    def composed(line):
+        for function in functions:
+            line = function(line)
+        return line
+    return composed
+
+# return the function applied to a whole column of strings for the instructions that can be vectorized, None otherwise
+def column_function(instruction, dict_instruction):
+    if instruction == "LOWERCASE":
+        return lambda column: column.str.lower()
+    elif instruction == "REMOVE_PUNCT":
+        translation_table = str.maketrans('', '', dict_instruction.get("punctuation", string.punctuation))
+        return lambda column: column.str.translate(translation_table)
+    elif instruction == "REMOVE_URLS":
+        return lambda column: column.str.replace(url_pattern, '', regex=True)
+    elif instruction == "REMOVE_HTML":
+        return lambda column: column.str.replace(html_pattern, '', regex=True)
+    elif instruction == "REMOVE_EMOJI":
+        return lambda column: column.str.replace(emoji_pattern, '', regex=True)
+    elif instruction == "REMOVE_EMOTICONS":
+        return lambda column: column.str.replace(emoticon_pattern, '', regex=True)
+    else:
+        return None
+
+# instructions that change each character of the text independently of the others, consecutive ones are applied with one
+# translation table (see translation.py)
+character_instructions = ["LOWERCASE", "REMOVE_PUNCT", "REMOVE_EMOJI"]
+# translation tables already built, the keys are the instructions dumped in json
+character_tables = {}
+
+# return the translation table of consecutive character instructions, built once per list of instructions and arguments
+def character_table(instructions):
+    key = json.dumps([[instruction, dict_instruction] for name, instruction, dict_instruction in instructions])
+    if key not in character_tables:
+        character_tables[key] = CharacterTable([cell_function(instruction, dict_instruction) for name, instruction, dict_instruction in instructions])
+    return character_tables[key]
+
+# check if consecutive character instructions are applied with a translation table, str.lower alone is faster
+def is_translated(instructions):
+    return any(instruction != "LOWERCASE" for name, instruction, dict_instruction in instructions)
+
+# return the per-cell function of consecutive character instructions: one str.translate with their table. str.lower turns
+# a capital sigma at the end of a word into a final sigma, which depends on the characters around, so the texts with a
+# capital sigma are lowercased by the functions one after the other
+def characters_function(instructions):
+    function = compose([cell_function(instruction, dict_instruction) for name, instruction, dict_instruction in instructions])
+    if not is_translated(instructions):
+        return function
+    table = character_table(instructions)
+    lowercased = any(instruction == "LOWERCASE" for name, instruction, dict_instruction in instructions)
+
+    def translate_characters(line):
+        text = str(line)
+        if lowercased and "\u03a3" in text:
+            return function(text)
+        return text.translate(table)
+    return translate_characters
+
+# return the function applied to a whole column of strings for consecutive character instructions
+def characters_column_function(instructions):
+    if not is_translated(instructions):
+        return compose([column_function(instruction, dict_instruction) for name, instruction, dict_instruction in instructions])
+    table = character_table(instructions)
+    function = characters_function(instructions)
+    lowercased = any(instruction == "LOWERCASE" for name, instruction, dict_instruction in instructions)
+
+    def translate_column(column):
+        result = column.str.translate(table)
+        if lowercased:
+            sigma = column.str.contains("\u03a3", regex=False)
+            if sigma.any():
+                result[sigma] = column[sigma].map(function)
+        return result
+    return translate_column
+
+# return the functions applied to a whole column for the instructions of a vectorized segment, consecutive character
+# instructions are applied together
+def column_functions(instructions):
+    functions = []
+    for is_character, group in groupby(instructions, key=lambda item: item[1] in character_instructions):
+        group = list(group)
+        if is_character:
+            functions.append(characters_column_function(group))
         else:
-            columns_to_process = [target]
-
-        dict_target = dict_json[target]
-        # browse through the instructions of the column
-        for instruction, value in dict_target.items():
-            print(f"Instruction {instruction} in progress...")
-            dict_instruction = dict_target[instruction]
-            # check if it's an instruction with a number (ex: EXTRACT_REGEX_PATTERN_1) if we have to apply the same instruction several times 
-            if instruction not in dict_check_instructions.keys():
-                instruction = instruction[:-2]
-            # removing punctuation
-            if instruction == "REMOVE_PUNCT":
-                if "punctuation" not in dict_instruction.keys():
-                    df_copy[columns_to_process] = df_copy[columns_to_process].applymap(lambda line: remove_punctuation(line, string.punctuation))
-                else:
-                    df_copy[columns_to_process] = df_copy[columns_to_process].applymap(lambda line: remove_punctuation(line, dict_instruction["punctuation"]))
-                continue
-            # removing stopwords
-            elif instruction == "REMOVE_STOPWORDS":
-                nltk.download('stopwords', quiet=True)
-                if "language" not in dict_instruction.keys():
-                    STOPWORDS = set(stopwords.words('english'))
-                else:
-                    STOPWORDS = set(stopwords.words(dict_instruction["language"]))
-
-                df_copy[columns_to_process] = df_copy[columns_to_process].applymap(lambda line: remove_stopwords(line, STOPWORDS))
-                continue
-            # lemmatize_english
-            elif instruction == "LEMMATIZE_ENGLISH":
-                nltk.download('wordnet', quiet=True)
-                nltk.download('averaged_perceptron_tagger', quiet=True)
-                nltk.download('punkt', quiet=True)
-                df_copy[columns_to_process] = df_copy[columns_to_process].applymap(lemmatize_words_eng)
-                continue
-            # removing frequent words or rare words
-            elif instruction == "REMOVE_FREQUENT" or instruction == "REMOVE_RARE":
-                for column in columns_to_process:
-                    text_join = " ".join(df_copy[column])
-                    text_split = text_join.split(" ")
-                    text_split = [word for word in text_split if word.strip()]
-                    count_words = Counter(text_split)
-                    most_common = count_words.most_common()
-
-                    if instruction == "REMOVE_FREQUENT":
-                        if "nb_words" in dict_instruction.keys() and "apply" not in dict_instruction.keys():
-                            print(f"Most frequent words in the column {column}\n{most_common[:int(dict_instruction['nb_words'])]}")
-                        if "nb_words" in dict_instruction.keys() and "apply" in dict_instruction.keys():
-                            print(f"Most frequent words in the column {column}\n{most_common[:int(dict_instruction['nb_words'])]}")
-                            words_to_remove = [w for (w, word_count) in most_common[:int(dict_instruction["nb_words"])]]
-                            df_copy[column] = df_copy[column].apply(lambda line: remove_freq_or_rare_words(line, words_to_remove))
-                    
-                    if instruction == "REMOVE_RARE":
-                        if "nb_words" in dict_instruction.keys() and "apply" not in dict_instruction.keys():
-                            print(f"Most rare words in the column {column}\n{most_common[-int(dict_instruction['nb_words']):]}")
-                        if "nb_words" in dict_instruction.keys() and "apply" in dict_instruction.keys():
-                            print(f"Most rare words in the column {column}\n{most_common[-int(dict_instruction['nb_words']):]}")
-                            words_to_remove = [w for (w, word_count) in most_common[-int(dict_instruction["nb_words"]):]]
-                            df_copy[column] = df_copy[column].apply(lambda line: remove_freq_or_rare_words(line, words_to_remove))
-                    continue
-            # stemming
-            elif instruction == "STEM":
-                if "language" not in dict_instruction.keys():
-                    df_copy[columns_to_process] = df_copy[columns_to_process].applymap(lambda line: stem_words(line, "english"))
-                else:
-                    df_copy[columns_to_process] = df_copy[columns_to_process].applymap(lambda line: stem_words(line, dict_instruction["language"]))
-                continue
-            # extract regex pattern
-            elif instruction == "EXTRACT_REGEX_PATTERN":
-                secondary_regex_pattern = None
-                new_column_name = columns_to_process
-                result_type = "list"
-                if "secondary_regex_pattern" in dict_instruction.keys():
-                    secondary_regex_pattern = dict_instruction["secondary_regex_pattern"]
-                if "new_column_name" in dict_instruction.keys():
-                    new_column_name = dict_instruction["new_column_name"]
-                if "result_type" in dict_instruction.keys():
-                    result_type = dict_instruction["result_type"]
-                df_copy[new_column_name] = df_copy[columns_to_process].applymap(lambda line: extract_regex_pattern(line, dict_instruction["regex_pattern"], secondary_regex_pattern, result_type))
+            functions.extend(column_function(instruction, dict_instruction) for name, instruction, dict_instruction in group)
+    return functions
+
+# result types of EXTRACT_REGEX_PATTERN that only use the first match of the pattern
+first_match_types = ["int", "float", "date", "datetime"]
+# references to groups by number, they would point to other groups once the pattern is put in a bigger pattern
+group_reference_pattern = re.compile(r"\\[1-9]|\(\?\(\d")
+
+# return the pattern with two groups: the text of re.findall (the whole match or the only group of the pattern) and an
+# empty group telling if the pattern matched (the group of the pattern can be out of the match). The groups are added
+# after the ones of the pattern so their numbers don't change. None if re.findall returns tuples (several groups) or if
+# the pattern can't be put in a group (ex: global flags)
+def extract_pattern(regex_pattern):
+    try:
+        groups = re.compile(regex_pattern).groups
+        if groups == 0:
+            return re.compile("((?:" + regex_pattern + "))()").pattern
+        elif groups == 1:
+            return re.compile("(?:" + regex_pattern + ")()").pattern
+    except re.error:
+        return None
+    return None
+
+# first match of an extraction from the groups of its pattern (see extract_pattern) at the position of the extraction:
+# None without match and, like re.findall, an empty text when the group of the pattern is not in the match
+def first_match(groups, position):
+    if groups is None or groups[position + 1] is None:
+        return None
+    return groups[position] or ""
+
+# return how EXTRACT_REGEX_PATTERN is applied to a whole column from the first match of its patterns (see extract_values),
+# None if it needs all the matches or several groups and is applied with its per-cell function
+def column_extractor(dict_instruction):
+    result_type = dict_instruction.get("result_type", "list")
+    if result_type not in first_match_types:
+        return None
+    pattern = extract_pattern(dict_instruction["regex_pattern"])
+    secondary_regex_pattern = dict_instruction.get("secondary_regex_pattern", None)
+    secondary_pattern = extract_pattern(secondary_regex_pattern) if secondary_regex_pattern else None
+    if pattern is None or (secondary_regex_pattern and secondary_pattern is None):
+        return None
+    return {"pattern": re.compile(pattern), "secondary_pattern": re.compile(secondary_pattern) if secondary_pattern else None, "result_type": result_type}
+
+# combine the patterns of several extractions into one: the lookahead of each pattern finds its first match from the
+# beginning of the text, so one match per text gives the first match of all of them (two groups per pattern).
+# None if a pattern refers to its groups by number or if the patterns can't be combined (ex: same group names)
+def combine_patterns(patterns):
+    if any(group_reference_pattern.search(pattern) for pattern in patterns):
+        return None
+    try:
+        return re.compile("".join(f"(?:(?=(?s:.*?){pattern}))?" for pattern in patterns))
+    except re.error:
+        return None
+
+# the texts of a column as the per-cell functions see them, only once per distinct text if the column has few distinct
+# values (see dedup_ratio), with the position of the text of each row in the list (None if all the texts are kept)
+def column_texts(column, dedup_ratio):
+    texts = [str(value) for value in column.astype(object)]
+    if not is_low_cardinality(column, dedup_ratio):
+        return texts, None
+    codes, unique_texts = pd.factorize(pd.Series(texts, dtype=object))
+    return list(unique_texts), codes
+
+# return the values of an extraction for a list of texts from the groups of the first match of its pattern in each text
+# (see first_match). The numbers are converted all at once. The texts whose first match doesn't contain the secondary
+# pattern (it can be in a next match) and the numbers that pandas could read differently from python use the per-cell function
+def extract_values(texts, all_groups, position, extract):
+    extractor = extract["extractor"]
+    matches = [first_match(groups, position) for groups in all_groups]
+    per_cell = []
+    if extractor["secondary_pattern"] is not None:
+        for i, match in enumerate(matches):
+            if match is None:
                 continue
-            # functions without additional argument
-            elif instruction in instructions_without_argument.keys():
-                df_copy[columns_to_process] = df_copy[columns_to_process].applymap(instructions_without_argument[instruction])
+            secondary_match = extractor["secondary_pattern"].search(match)
+            matches[i] = first_match(secondary_match.groups() if secondary_match else None, 0)
+            if matches[i] is None:
+                per_cell.append(i)
+
+    positions = [i for i, match in enumerate(matches) if match is not None]
+    result_type = extractor["result_type"]
+    if result_type == "int":
+        # the numbers made of ascii digits fit in an int64, the others (ex: other digits) use the per-cell function
+        found = [matches[i] for i in positions]
+        joined = "".join(found)
+        if not (all(found) and joined.isascii() and joined.isdigit() and max(map(len, found), default=0) <= 18):
+            numbers = [i for i in positions if matches[i].isascii() and matches[i].isdigit() and len(matches[i]) <= 18]
+            per_cell.extend(sorted(set(positions) - set(numbers)))
+            positions = numbers
+        values = pd.Series([matches[i] for i in positions], dtype=object).astype("int64").tolist()
+    elif result_type == "float":
+        # astype reads the numbers like int() and float(), pd.to_numeric can differ on the last digit of a float
+        try:
+            values = pd.Series([matches[i] for i in positions], dtype=object).astype(float).tolist()
+        except ValueError:
+            per_cell.extend(positions)
+            positions, values = [], []
+    elif result_type == "date":
+        values = [parse_date(matches[i]).date() for i in positions]
+    else:
+        values = [parse_date(matches[i]) for i in positions]
+
+    results = [{"int": 0, "float": 0.0}.get(result_type, None)] * len(texts)
+    for i, value in zip(positions, values):
+        results[i] = value
+    for i in per_cell:
+        results[i] = extract["function"](texts[i])
+    return results
+
+# check if the vectorized functions can be applied to a column: the values of an object column (strings, NaN, lists, ...) are
+# turned into texts like the per-cell functions do with str(text)
+def is_object_column(column):
+    return column.dtype == object
+
+# the values of an object column as texts, the column itself if all its values are already strings
+def column_as_texts(column):
+    if pd.api.types.infer_dtype(column, skipna=False) == "string":
+        return column
+    return column.map(str)
+
+"""
+The instructions of a target are compiled into a plan before being applied. A plan is a list of stages:
+- "cell": consecutive per-cell instructions composed into one function, so the columns are walked only once for all of them.
+- "corpus": REMOVE_FREQUENT and REMOVE_RARE, which need the word counts of the whole column before they can be applied.
+- "extract": EXTRACT_REGEX_PATTERN with a new_column_name, which writes its result in other columns than the ones it reads.
+  Consecutive extractions are put in the same stage, in "extracts" (see apply_extract).
+Each stage is a dictionary with the names of its instructions (as written in the json file) in "names" and the list of
+[name, instruction, arguments] in "instructions", which is what the worker processes receive to compile the stage again.
+A "cell" stage is divided in "segments": consecutive instructions that can be vectorized (see column_function) are applied
+with the str methods of pandas on the columns of strings, consecutive instructions working on words (see token_function)
+are applied to the vocabulary of the columns (see map_vocabulary) and the others with their per-cell function. In the
+vectorized and per-cell functions, consecutive LOWERCASE, REMOVE_PUNCT and REMOVE_EMOJI are applied with one str.translate
+(see character_instructions).
+"function" is the function of a stage or segment applied to one cell and "batch_function" the one applied to a list of
+cells, where the instructions of batch_function (LEMMATIZE_ENGLISH, which tags the POS of all the cells at once, and
+CONVERT_TO_DATE_OR_DATETIME, which parses all the cells with the same format) get all the cells together.
+"""
+corpus_instructions = ["REMOVE_FREQUENT", "REMOVE_RARE"]
+
+# compile the per-cell instructions of a stage into one function
+# consecutive instructions working on words keep the list of words between them instead of joining and splitting the text again
+# and consecutive character instructions go through the text only once
+def stage_function(instructions):
+    functions = []
+    token_functions = []
+    characters = []
+    for name, instruction, dict_instruction in instructions:
+        function = None if instruction in character_instructions else token_function(instruction, dict_instruction)
+        if function is None and token_functions:
+            functions.append(tokens_function(token_functions))
+            token_functions = []
+        if instruction not in character_instructions and characters:
+            functions.append(characters_function(characters))
+            characters = []
+        if instruction in character_instructions:
+            characters.append([name, instruction, dict_instruction])
+        elif function is not None:
+            token_functions.append(function)
+        else:
+            functions.append(cell_function(instruction, dict_instruction))
+    if token_functions:
+        functions.append(tokens_function(token_functions))
+    if characters:
+        functions.append(characters_function(characters))
+    return compose(functions)
+
+# compile the instructions of a stage into one function applied to a list of cells: the instructions of batch_function
+# receive all the cells at once, the others are applied cell by cell
+def stage_batch_function(instructions):
+    functions = []
+    cell_instructions = []
+    for name, instruction, dict_instruction in instructions:
+        function = batch_function(instruction, dict_instruction)
+        if function is None:
+            cell_instructions.append([name, instruction, dict_instruction])
+            continue
+        if cell_instructions:
+            functions.append(values_function(stage_function(cell_instructions)))
+            cell_instructions = []
+        functions.append(function)
+    if cell_instructions:
+        functions.append(values_function(stage_function(cell_instructions)))
+    return compose(functions)
+
+# check if some instructions of a stage are applied to lists of cells
+def is_batched(instructions):
+    return any(is_batch_instruction(instruction, dict_instruction) for name, instruction, dict_instruction in instructions)
+
+# compile the instructions of a target into a plan, with fuse=False each instruction has its own stage
+def build_plan(dict_target, fuse=True):
+    plan = []
+    for name, dict_instruction in dict_target.items():
+        instruction = base_instruction(name)
+        if instruction in corpus_instructions:
+            plan.append({"kind": "corpus", "names": [name], "instruction": instruction, "arguments": dict_instruction})
+            continue
+        if instruction not in cell_instructions:
+            continue
+        if instruction == "EXTRACT_REGEX_PATTERN" and "new_column_name" in dict_instruction.keys():
+            extract = {"names": [name], "instructions": [[name, instruction, dict_instruction]], "new_column_name": dict_instruction["new_column_name"]}
+            if fuse and plan and plan[-1]["kind"] == "extract":
+                plan[-1]["names"].append(name)
+                plan[-1]["instructions"].append([name, instruction, dict_instruction])
+                plan[-1]["new_column_name"] = plan[-1]["new_column_name"] + dict_instruction["new_column_name"]
+                plan[-1]["extracts"].append(extract)
+            else:
+                plan.append({"kind": "extract", "names": [name], "instructions": [[name, instruction, dict_instruction]],
+                             "new_column_name": list(dict_instruction["new_column_name"]), "extracts": [extract]})
+        elif fuse and plan and plan[-1]["kind"] == "cell":
+            plan[-1]["names"].append(name)
+            plan[-1]["instructions"].append([name, instruction, dict_instruction])
+        else:
+            plan.append({"kind": "cell", "names": [name], "instructions": [[name, instruction, dict_instruction]]})
+    for stage in plan:
+        if stage["kind"] == "cell":
+            stage["function"] = stage_function(stage["instructions"])
+            stage["batched"] = is_batched(stage["instructions"])
+            stage["batch_function"] = stage_batch_function(stage["instructions"]) if stage["batched"] else values_function(stage["function"])
+            stage["segments"] = build_segments(stage["instructions"])
+        elif stage["kind"] == "extract":
+            build_extracts(stage)
+    return plan
+
+# compile the extractions of an "extract" stage, and the pattern combining the ones applied to whole columns
+def build_extracts(stage):
+    for extract in stage["extracts"]:
+        extract["function"] = stage_function(extract["instructions"])
+        extract["batched"] = False
+        extract["batch_function"] = values_function(extract["function"])
+        extract["extractor"] = column_extractor(extract["instructions"][0][2])
+    patterns = [extract["extractor"]["pattern"].pattern for extract in stage["extracts"] if extract["extractor"] is not None]
+    stage["pattern"] = combine_patterns(patterns) if len(patterns) > 1 else None
+
+# divide the instructions of a "cell" stage into vectorized, vocabulary and per-cell segments
+def build_segments(instructions):
+    segments = []
+    for name, instruction, dict_instruction in instructions:
+        vectorized = column_function(instruction, dict_instruction) is not None
+        vocabulary = not vectorized and token_function(instruction, dict_instruction) is not None
+        if segments and segments[-1]["vectorized"] == vectorized and segments[-1]["vocabulary"] == vocabulary:
+            segments[-1]["instructions"].append([name, instruction, dict_instruction])
+        else:
+            segments.append({"vectorized": vectorized, "vocabulary": vocabulary, "instructions": [[name, instruction, dict_instruction]]})
+    for segment in segments:
+        segment["function"] = stage_function(segment["instructions"])
+        segment["batched"] = is_batched(segment["instructions"])
+        segment["batch_function"] = stage_batch_function(segment["instructions"]) if segment["batched"] else values_function(segment["function"])
+        if segment["vectorized"]:
+            segment["column_function"] = compose(column_functions(segment["instructions"]))
+        if segment["vocabulary"]:
+            segment["words_function"] = compose([token_function(instruction, dict_instruction) for name, instruction, dict_instruction in segment["instructions"]])
+    return segments
+
+# apply a vectorized segment to the columns, the columns that are not object columns (numbers, dates) use the per-cell functions
+def apply_vectorized(df_copy, columns_to_process, segment):
+    for column in columns_to_process:
+        if is_object_column(df_copy[column]):
+            df_copy[column] = segment["column_function"](column_as_texts(df_copy[column]))
+        else:
+            df_copy[[column]] = df_copy[[column]].applymap(segment["function"])
+
+# apply an "extract" stage to the columns. The extractions that only need the first match of their pattern are applied to
+# the distinct texts of the columns, with one match per text for all of them when their patterns are combined, and the
+# others with their per-cell function. The combined pattern is not used when a new column replaces a column read by the
+# stage, the extractions are then applied one after the other
+def apply_extract(df_copy, columns_to_process, stage, execution):
+    combined = stage["pattern"] is not None and not set(stage["new_column_name"]) & set(columns_to_process)
+    scans = {}
+    group = 0
+    for extract in stage["extracts"]:
+        if extract["extractor"] is None or len(df_copy) == 0:
+            df_copy[extract["new_column_name"]] = map_cells(df_copy[columns_to_process], extract, execution)
+            continue
+        results = {}
+        for i, column in enumerate(columns_to_process):
+            if combined:
+                if column not in scans:
+                    texts, codes = column_texts(df_copy[column], execution["dedup_ratio"])
+                    scans[column] = texts, codes, [stage["pattern"].match(text).groups() for text in texts]
+                texts, codes, all_groups = scans[column]
+                values = extract_values(texts, all_groups, 2 * group, extract)
+            else:
+                texts, codes = column_texts(df_copy[column], execution["dedup_ratio"])
+                matches = [extract["extractor"]["pattern"].search(text) for text in texts]
+                values = extract_values(texts, [match.groups() if match else None for match in matches], 0, extract)
+            # infer_objects gives the values the same types as applymap with the per-cell function
+            values = pd.Series(values, dtype=object).infer_objects()
+            if codes is not None:
+                values = values.take(codes)
+            results[i] = pd.Series(values.to_numpy(), index=df_copy.index)
+        group += 1
+        frame_results = pd.DataFrame(results)
+        frame_results.columns = columns_to_process
+        df_copy[extract["new_column_name"]] = frame_results
+
+# number of rows joined together when the words of a column are counted
+COUNT_CHUNK_ROWS = 10000
+
+# return the counter of the words of a corpus stage: a Counter, or a sketch with a fixed memory when the words are only
+# printed in approximate mode
+def create_word_counter(stage):
+    dict_instruction = stage["arguments"]
+    if "apply" in dict_instruction.keys() or dict_instruction.get("mode", "exact") == "exact":
+        return Counter()
+    sketch_size = int(dict_instruction.get("sketch_size", 100000))
+    if stage["instruction"] == "REMOVE_FREQUENT":
+        return MisraGries(sketch_size)
+    return CountMinSketch(width=sketch_size, capacity=sketch_size)
+
+# count the words of a column in the counter (new Counter by default), the rows are joined and split by chunks so the
+# memory used depends on the number of distinct words and not on the size of the column
+def count_column_words(column_values, count_words=None):
+    if count_words is None:
+        count_words = Counter()
+    column_values = list(column_values)
+    for i in range(0, len(column_values), COUNT_CHUNK_ROWS):
+        text_join = " ".join(column_values[i:i + COUNT_CHUNK_ROWS])
+        text_split = text_join.split(" ")
+        count_words.update(Counter(word for word in text_split if word.strip()))
+    return count_words
+
+# add the counts of a part of a column to the counter of the whole column
+def merge_word_counters(count_words, partial_count_words):
+    if isinstance(count_words, Counter):
+        count_words.update(partial_count_words)
+    else:
+        count_words.merge(partial_count_words)
+
+# print the most frequent or rare words of a column and return them
+def select_freq_or_rare_words(count_words, column, instruction, nb_words):
+    if isinstance(count_words, MisraGries):
+        most_common = count_words.most_common(nb_words)
+        print(f"Most frequent words in the column {column} (approximate: the counts are under the real ones by at most {count_words.error})\n{most_common}")
+        return [w for (w, word_count) in most_common]
+    elif isinstance(count_words, CountMinSketch):
+        most_rare = count_words.least_common(nb_words)
+        print(f"Most rare words in the column {column} (approximate: the counts are over the real ones by at most "
+              f"{count_words.error():.0f} with a probability of {count_words.confidence():.0%})\n{most_rare}")
+        return [w for (w, word_count) in most_rare]
+
+    most_common = count_words.most_common()
+    if instruction == "REMOVE_FREQUENT":
+        print(f"Most frequent words in the column {column}\n{most_common[:nb_words]}")
+        return [w for (w, word_count) in most_common[:nb_words]]
+    else:
+        print(f"Most rare words in the column {column}\n{most_common[-nb_words:]}")
+        return [w for (w, word_count) in most_common[-nb_words:]]
+
+# remove the frequent or rare words of the columns (or only print them if there is no argument apply)
+# the words can be given in advance in stage["words_to_remove"] when they were counted on the whole file (streaming) or
+# in a previous run (incremental), otherwise they are counted and kept there
+def apply_corpus_instruction(df_copy, columns_to_process, stage, execution):
+    dict_instruction = stage["arguments"]
+    for column in columns_to_process:
+        if column in stage.get("words_to_remove", {}).keys():
+            words_to_remove = stage["words_to_remove"][column]
+        else:
+            count_words = count_corpus_words_column(df_copy[column], create_word_counter(stage), stage, execution)
+            words_to_remove = select_freq_or_rare_words(count_words, column, stage["instruction"], int(dict_instruction["nb_words"]))
+            stage.setdefault("words_to_remove", {})[column] = words_to_remove
+
+        if "apply" in dict_instruction.keys():
+            df_copy[column] = remove_corpus_words_column(df_copy[column], words_to_remove, execution)
+
+#-------------------------------------------------------------Plan optimizer------------------------------------------------------------
+"""
+With optimize, the instructions of a target are reordered before the plan is compiled so that the cheap instructions are
+applied before the expensive ones, which then have less text to process. Two neighbour instructions are swapped only if
+they commute (same result in both orders):
+- "exact": only the pairs that always give the same result (exact_commutations).
+- "fast": also the pairs in approximate_commutations, where removing words, punctuation, urls, ... before the spelling
+  correction, the lemmatization or the stemming gives the same result in most cases but not always (ex: a word corrected
+  into a stopword is no longer removed, the POS tags of the lemmatizer depend on the words around). Lowercasing before or
+  after removing the punctuation or the html tags only differs on the capital sigmas.
+The instructions that are in none of these pairs (REMOVE_FREQUENT, REMOVE_RARE, EXTRACT_REGEX_PATTERN, ...) are never moved
+and nothing is moved across them. The order chosen for each target is printed.
+"""
+# relative cost of the instructions for one cell
+instruction_costs = {"LOWERCASE": 1, "REMOVE_PUNCT": 1, "REMOVE_HTML": 2, "REMOVE_URLS": 2, "REMOVE_EMOJI": 2,
+                     "REMOVE_STOPWORDS": 3, "CHAT_WORDS_CONVERSION": 5, "REMOVE_EMOTICONS": 2, "CONVERT_EMOTICONS": 3,
+                     "STEM": 50, "CONVERT_EMOJIS": 200, "LEMMATIZE_ENGLISH": 500, "SPELL_CORRECTION": 5000}
+
+# check if the punctuation removed by REMOVE_PUNCT is made only of ascii characters that are not letters, lowercasing can't
+# create or remove them
+def uncased_punctuation(dict_instruction):
+    punctuation = dict_instruction.get("punctuation", string.punctuation)
+    return all(ord(character) < 128 and not character.isalpha() for character in punctuation)
+
+# pairs of instructions that always commute, with a function checking the arguments of the first and the second one.
+# REMOVE_EMOJI and REMOVE_PUNCT both remove characters one by one, whatever the characters around
+exact_commutations = {("REMOVE_EMOJI", "REMOVE_PUNCT"): lambda first, second: True,
+                      ("REMOVE_STOPWORDS", "REMOVE_STOPWORDS"): lambda first, second: True}
+
+# pairs of instructions that give the same result in most cases. The lowercase of a capital sigma depends on the next
+# character (final sigma at the end of a word), so removing the punctuation or the html tags after it can change it
+# ("ΑΣ!Β" -> "αςβ" but "ασβ" when the punctuation is removed first)
+approximate_commutations = {("LOWERCASE", "REMOVE_PUNCT"): lambda first, second: uncased_punctuation(second),
+                            ("LOWERCASE", "REMOVE_HTML"): lambda first, second: True}
+for cheap_instruction in ["REMOVE_STOPWORDS", "REMOVE_PUNCT", "REMOVE_URLS", "REMOVE_HTML", "REMOVE_EMOJI", "REMOVE_EMOTICONS"]:
+    for expensive_instruction in ["SPELL_CORRECTION", "LEMMATIZE_ENGLISH", "STEM"]:
+        approximate_commutations[(cheap_instruction, expensive_instruction)] = lambda first, second: True
+
+# check if two instructions ([name, instruction, arguments]) commute
+def commute(first, second, optimize):
+    commutations = dict(exact_commutations)
+    if optimize == "fast":
+        commutations.update(approximate_commutations)
+    if (first[1], second[1]) in commutations.keys():
+        return commutations[(first[1], second[1])](first[2], second[2])
+    if (second[1], first[1]) in commutations.keys():
+        return commutations[(second[1], first[1])](second[2], first[2])
+    return False
+
+# reorder the instructions of a target, the cheaper instructions go before the more expensive ones they commute with
+def optimize_instructions(dict_target, optimize):
+    instructions = [[name, base_instruction(name), dict_instruction] for name, dict_instruction in dict_target.items()]
+    swapped = True
+    while swapped:
+        swapped = False
+        for i in range(len(instructions) - 1):
+            first, second = instructions[i], instructions[i + 1]
+            if instruction_costs.get(second[1], 0) < instruction_costs.get(first[1], 0) and commute(first, second, optimize):
+                instructions[i], instructions[i + 1] = second, first
+                swapped = True
+    return OrderedDict((name, dict_instruction) for name, instruction, dict_instruction in instructions)
+
+#-------------------------------------------------------Multi-core execution-----------------------------------------------------------
+"""
+With workers > 1, the "cell" and "extract" stages are applied by a pool of processes on chunks of chunksize cells.
+The functions of a stage (lambdas) can't be sent to the processes, so each process compiles the stage again from its
+instructions and keeps it in compiled_stages.
+The "corpus" stages need the word counts of the whole column, they are applied in two passes: the processes count the
+words of their chunks, the main process merges the counters in the order of the chunks and selects the words to remove,
+then the processes remove these words from their chunks. The merged counter has the words in the order of their first
+occurrence in the column, like the counter of a serial run, so the words with the same count are sorted the same way by
+most_common and the result is the same as a serial run.
+With a cache (see cache.py), only the cells whose text is not already in the cache are computed.
+When a column has few distinct values compared to its number of rows (less than dedup_ratio, like Metadata and Time), the
+stage is applied only once per distinct text and the results are copied to the rows. All the per-cell functions start
+with str(text), so the cells with the same text have the same result.
+The options of the execution (executor, chunksize, cache, dedup_ratio, verbose) are kept in a dictionary given to the
+functions below.
+"""
+# functions compiled by the current process, the keys are the instructions of the stage dumped in json
+compiled_stages = {}
+
+# apply the instructions of a stage to a chunk of values (run in the worker processes)
+def apply_chunk(instructions, values):
+    key = json.dumps(instructions)
+    if key not in compiled_stages:
+        compiled_stages[key] = stage_batch_function(instructions)
+    function = compiled_stages[key]
+    return function(values)
+
+# split values in chunks of chunksize values
+def split_chunks(values, chunksize):
+    return [values[i:i + chunksize] for i in range(0, len(values), chunksize)]
+
+# count the words of a chunk of values for a corpus stage (first pass, run in the worker processes)
+def count_chunk(instruction, dict_instruction, values):
+    return count_column_words(values, create_word_counter({"instruction": instruction, "arguments": dict_instruction}))
+
+# remove the words of a corpus stage from a chunk of values (second pass, run in the worker processes)
+def remove_words_chunk(words_to_remove, values):
+    words_set = set(words_to_remove)
+    return [remove_freq_or_rare_words(value, words_set) for value in values]
+
+# count the words of a column in the counter, in the pool of processes if there is one
+def count_corpus_words_column(column_values, count_words, stage, execution):
+    if execution["executor"] is None:
+        return count_column_words(column_values, count_words)
+    chunks = split_chunks(list(column_values), execution["chunksize"])
+    for partial_count_words in execution["executor"].map(count_chunk, [stage["instruction"]] * len(chunks), [stage["arguments"]] * len(chunks), chunks):
+        merge_word_counters(count_words, partial_count_words)
+    return count_words
+
+# remove the words from a column, in the pool of processes if there is one
+def remove_corpus_words_column(column_values, words_to_remove, execution):
+    if execution["executor"] is None:
+        words_set = set(words_to_remove)
+        return column_values.apply(lambda line: remove_freq_or_rare_words(line, words_set))
+    chunks = split_chunks(list(column_values), execution["chunksize"])
+    results = []
+    for chunk_results in execution["executor"].map(remove_words_chunk, [words_to_remove] * len(chunks), chunks):
+        results.extend(chunk_results)
+    return pd.Series(results, index=column_values.index, dtype=object, name=column_values.name)
+
+# apply the function of a stage to lists of values (one list per column), in the pool of processes if there is one
+def compute_values(values_by_column, stage, execution):
+    if execution["executor"] is None:
+        return [stage["batch_function"](values) for values in values_by_column]
+
+    all_values = [value for values in values_by_column for value in values]
+    chunks = split_chunks(all_values, execution["chunksize"])
+    all_results = []
+    for chunk_results in execution["executor"].map(apply_chunk, [stage["instructions"]] * len(chunks), chunks):
+        all_results.extend(chunk_results)
+
+    results = []
+    position = 0
+    for values in values_by_column:
+        results.append(all_results[position:position + len(values)])
+        position += len(values)
+    return results
+
+# apply the function of a stage to lists of values with the cache if there is one
+def compute_or_cache(values_by_column, stage, execution):
+    if execution["cache"] is None:
+        return compute_values(values_by_column, stage, execution)
+    texts_by_column = [[str(value) for value in values] for values in values_by_column]
+    return execution["cache"].map(stage["instructions"], texts_by_column, lambda texts: compute_values([texts], stage, execution)[0])
+
+# check if a column has few distinct values compared to its number of rows
+def is_low_cardinality(column, dedup_ratio):
+    try:
+        nb_values = column.nunique(dropna=False)
+    except TypeError:
+        # unhashable values (ex: lists of EXTRACT_REGEX_PATTERN), counted with their texts as the functions see them
+        nb_values = column.astype(str).nunique()
+    return nb_values < dedup_ratio * len(column)
+
+# apply the function of a stage to every cell of the frame, serially or in the pool of processes, with the cache and
+# only once per distinct text if the columns have few distinct values
+def map_cells(frame, stage, execution):
+    if len(frame) == 0:
+        return frame.applymap(stage["function"])
+    dedup = any(is_low_cardinality(frame.iloc[:, i], execution["dedup_ratio"]) for i in range(frame.shape[1]))
+    if not dedup and execution["executor"] is None and execution["cache"] is None and not stage["batched"]:
+        return frame.applymap(stage["function"])
+
+    values_by_column = [list(frame.iloc[:, i].astype(object)) for i in range(frame.shape[1])]
+    if dedup:
+        texts_by_column = [[str(value) for value in values] for values in values_by_column]
+        unique_texts = list(dict.fromkeys(text for texts in texts_by_column for text in texts))
+        result_by_text = dict(zip(unique_texts, compute_or_cache([unique_texts], stage, execution)[0]))
+        results = [[result_by_text[text] for text in texts] for texts in texts_by_column]
+    else:
+        results = compute_or_cache(values_by_column, stage, execution)
+
+    # the results are put back in the original order, applymap gives them the same types as a serial run
+    frame_results = pd.DataFrame({i: pd.Series(values, index=frame.index, dtype=object) for i, values in enumerate(results)})
+    frame_results.columns = frame.columns
+    return frame_results.applymap(lambda value: value)
+
+# apply the word instructions of a segment to every cell of the frame through the vocabulary of the frame: each distinct
+# word gets an id, the instructions are applied once per distinct word (serially or in the pool of processes, with the
+# cache) and the cells are rebuilt from the ids of their words. The instructions of token_function don't depend on the
+# words around, so the result is the same as applying them to the list of words of each cell
+def map_vocabulary(frame, segment, execution):
+    if len(frame) == 0:
+        return frame.applymap(segment["function"])
+    vocabulary = {}
+    ids_by_column = [[[vocabulary.setdefault(word, len(vocabulary)) for word in str(value).split(" ")] for value in frame.iloc[:, i]]
+                     for i in range(frame.shape[1])]
+
+    # a word has no space, so the result of the segment for a word is its list of words joined with spaces. An empty result
+    # is either a removed word or an empty word, the list of words is computed again in this case
+    words = list(vocabulary.keys())
+    results = compute_or_cache([words], segment, execution)[0]
+    word_lists = [result.split(" ") if result != "" else segment["words_function"]([word]) for word, result in zip(words, results)]
+
+    frame_results = pd.DataFrame({i: pd.Series([" ".join([new_word for word_id in ids for new_word in word_lists[word_id]]) for ids in ids_by_column[i]],
+                                               index=frame.index, dtype=object)
+                                  for i in range(frame.shape[1])})
+    frame_results.columns = frame.columns
+    return frame_results
+
+# apply a stage of the plan to the columns of the dataframe
+def run_stage(df_copy, columns_to_process, stage, execution):
+    if execution["verbose"]:
+        for name in stage["names"]:
+            print(f"Instruction {name} in progress...")
+    if stage["kind"] == "corpus":
+        apply_corpus_instruction(df_copy, columns_to_process, stage, execution)
+    elif stage["kind"] == "extract":
+        apply_extract(df_copy, columns_to_process, stage, execution)
+    else:
+        for segment in stage["segments"]:
+            if segment["vectorized"]:
+                apply_vectorized(df_copy, columns_to_process, segment)
+            elif segment["vocabulary"]:
+                df_copy[columns_to_process] = map_vocabulary(df_copy[columns_to_process], segment, execution)
+            else:
+                df_copy[columns_to_process] = map_cells(df_copy[columns_to_process], segment, execution)
+
+# create the options of the execution: pool of processes when workers > 1 (with the default chunksize) and cache
+# cache can be the path of a sqlite file or a PreprocessingCache
+def create_execution(workers=1, chunksize=None, nb_cells=0, cache=None, dedup_ratio=0.5, verbose=True, profile=False):
+    execution = {"executor": None, "chunksize": chunksize, "cache": None, "close_cache": False, "dedup_ratio": dedup_ratio, "verbose": verbose,
+                 "profiler": Profiler() if profile else None, "checkpoint": None}
+    if workers > 1:
+        execution["executor"] = ProcessPoolExecutor(max_workers=workers)
+        if chunksize is None:
+            execution["chunksize"] = max(1, math.ceil(nb_cells / (workers * 4)))
+    if isinstance(cache, str):
+        execution["cache"] = PreprocessingCache(cache)
+        execution["close_cache"] = True
+    else:
+        execution["cache"] = cache
+    return execution
+
+# stop the pool of processes and close the cache if it was opened by create_execution
+def close_execution(execution):
+    if execution["executor"] is not None:
+        execution["executor"].shutdown()
+    if execution["close_cache"]:
+        execution["cache"].close()
+
+#--------------------------------------------------------------Checkpoints--------------------------------------------------------------
+"""
+With checkpoint_dir, the dataframe is saved in checkpoint_dir/checkpoint.pkl after each stage of the plans, with the index
+of the target and of the stage in checkpoint_dir/checkpoint.json. If the run stops (memory, kernel restart, ...),
+preprocessing(..., checkpoint_dir=..., resume=True) loads the dataframe and continues after the last stage saved.
+The dataframe is saved with pickle and not parquet/feather: the columns being preprocessed can contain python objects
+(dates, lists, mixed types) that have to come back exactly the same.
+The checkpoint is used only if the instructions file, the dataframe and the stages of the plans are the same, otherwise
+everything starts from the beginning. The checkpoint is removed at the end of the run.
+"""
+# hash of the content of a dataframe
+def dataframe_hash(df):
+    try:
+        hashes = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        # values that can't be hashed (ex: lists), hashed with their texts and the types of the columns
+        hashes = pd.util.hash_pandas_object(df.astype(str), index=True)
+    return hashlib.sha256(hashes.values.tobytes() + str(list(df.columns)).encode() + str(list(df.dtypes)).encode()).hexdigest()
+
+# information used to check that a checkpoint belongs to the same run
+def create_checkpoint(checkpoint_dir, instructions_file, df, plans):
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    return {"data_file": os.path.join(checkpoint_dir, "checkpoint.pkl"),
+            "state_file": os.path.join(checkpoint_dir, "checkpoint.json"),
+            "run": {"instructions_hash": file_hash(instructions_file), "data_hash": dataframe_hash(df),
+                    "stages": [[target, [stage["names"] for stage in plan]] for target, plan in plans]},
+            "resume_from": None}
+
+# save the dataframe after the stage stage_index of the target target_index
+def save_checkpoint(checkpoint, df_copy, target_index, stage_index, columns_to_process):
+    # written in temporary files first so that a checkpoint is never half written
+    df_copy.to_pickle(checkpoint["data_file"] + ".tmp")
+    os.replace(checkpoint["data_file"] + ".tmp", checkpoint["data_file"])
+    state = {"run": checkpoint["run"], "resume_from": [target_index, stage_index, list(columns_to_process)]}
+    with open(checkpoint["state_file"] + ".tmp", 'w') as json_file:
+        json.dump(state, json_file)
+    os.replace(checkpoint["state_file"] + ".tmp", checkpoint["state_file"])
+
+# load the dataframe of the checkpoint if it belongs to the same run, None otherwise
+def load_checkpoint(checkpoint):
+    if not os.path.isfile(checkpoint["state_file"]) or not os.path.isfile(checkpoint["data_file"]):
+        print("No checkpoint found, the preprocessing starts from the beginning.")
+        return None
+    with open(checkpoint["state_file"], 'r') as json_file:
+        state = json.load(json_file)
+    if state["run"] != checkpoint["run"]:
+        print("The checkpoint belongs to another run (instructions or data changed), the preprocessing starts from the beginning.")
+        return None
+    checkpoint["resume_from"] = state["resume_from"]
+    print(f"Resuming after the stage {state['resume_from'][1]} of the target {state['resume_from'][0]}.")
+    return pd.read_pickle(checkpoint["data_file"])
+
+def remove_checkpoint(checkpoint):
+    for path in [checkpoint["data_file"], checkpoint["state_file"]]:
+        if os.path.isfile(path):
+            os.remove(path)
+
+#-------------------------------------------------------------Preprocessing-------------------------------------------------------------
+# read the json file of instructions
+def load_instructions(instructions_file):
+    with open(instructions_file, 'r') as json_file:
+        return json.load(json_file, object_pairs_hook=OrderedDict)
+
+# compile the plan of each target of the json file, return a list of [target, plan]
+def build_plans(dict_json, fuse=True, optimize=False):
+    plans = []
+    for target, dict_target in dict_json.items():
+        if optimize:
+            dict_target = optimize_instructions(dict_target, optimize)
+            print(f"Order of the instructions of {target}: {list(dict_target.keys())}")
+        plans.append([target, build_plan(dict_target, fuse)])
+    return plans
+
+# apply the plans to the dataframe (in place). If until is a stage, stop just before it and return the columns of its target
+def apply_plans(plans, df_copy, execution, until=None):
+    checkpoint = execution["checkpoint"]
+    # browse through the names of columns to preprocess
+    for t, (target, plan) in enumerate(plans):
+        columns_to_process = target_columns(target, df_copy)
+        # the columns of a target started before the checkpoint are the ones it had at its beginning
+        if checkpoint is not None and checkpoint["resume_from"] is not None and checkpoint["resume_from"][0] == t:
+            columns_to_process = checkpoint["resume_from"][2]
+
+        for s, stage in enumerate(plan):
+            if stage is until:
+                return columns_to_process
+            if checkpoint is not None and checkpoint["resume_from"] is not None and (t, s) <= tuple(checkpoint["resume_from"][:2]):
+                if execution["verbose"]:
+                    print(f"Instructions {stage['names']} already applied (checkpoint).")
                 continue
-            # instruction not supported
+            if execution["profiler"] is None:
+                run_stage(df_copy, columns_to_process, stage, execution)
             else:
-                pass
+                columns_out = stage.get("new_column_name", columns_to_process)
+                execution["profiler"].run(target, stage, df_copy, columns_to_process, columns_out, lambda: run_stage(df_copy, columns_to_process, stage, execution))
+            if checkpoint is not None:
+                save_checkpoint(checkpoint, df_copy, t, s, columns_to_process)
 
+        if not execution["verbose"]:
+            continue
         if target == "ALL":
             print(f"All instructions have been applied to all columns.")
         elif target.startswith("COLUMNS"):
-            print(f"All instructions have been applied to the columns {list_columns}.")
+            print(f"All instructions have been applied to the columns {columns_to_process}.")
         else:
             print(f"All instructions have been applied to the column {target}.")
+    return None
+
+"""
+workers (int): number of processes used to apply the instructions. With 1 (default) everything runs in the current process.
+chunksize (int): number of cells sent to a process at once. By default the cells are split in 4 chunks per worker.
+cache (str or PreprocessingCache): sqlite file where the results are kept between the runs (see cache.py). No cache by default.
+dedup_ratio (float): the instructions are applied once per distinct text in the columns whose number of distinct values is
+lower than dedup_ratio * number of rows (0 to never do it).
+profile (bool): measure the time and memory of each instruction (see profiler.py) and return (dataframe, report) instead of
+the dataframe. The instructions are not fused so that each one is measured on its own.
+trace_file (str): with profile=True, file where the trace of the instructions is written (chrome://tracing format).
+optimize (str): "exact" or "fast" to reorder the instructions so that the cheap ones are applied first (see Plan optimizer).
+checkpoint_dir (str): directory where the dataframe is saved after each stage (see Checkpoints). No checkpoint by default.
+resume (bool): with checkpoint_dir, continue from the last stage saved instead of starting from the beginning.
+"""
+def preprocessing(instructions_file, df, workers=1, chunksize=None, cache=None, dedup_ratio=0.5, profile=False, trace_file=None, optimize=False, checkpoint_dir=None, resume=False):
+
+    # check the instructions
+    check_instructions(dict_check_instructions, instructions_file, df)  
+
+    dict_json = load_instructions(instructions_file)
+    plans = build_plans(dict_json, fuse=not profile, optimize=optimize)
+
+    checkpoint = None
+    df_copy = None
+    if checkpoint_dir is not None:
+        checkpoint = create_checkpoint(checkpoint_dir, instructions_file, df, plans)
+        if resume:
+            df_copy = load_checkpoint(checkpoint)
+    if df_copy is None:
+        df_copy = df.copy()
+
+    execution = create_execution(workers, chunksize, len(df_copy), cache, dedup_ratio, profile=profile)
+    execution["checkpoint"] = checkpoint
+    try:
+        # compile the instructions of each column into a plan and apply it
+        apply_plans(plans, df_copy, execution)
+    finally:
+        close_execution(execution)
         
+    if checkpoint is not None:
+        remove_checkpoint(checkpoint)
+    print("All instructions have been applied.")
+
+    if profile:
+        if trace_file is not None:
+            execution["profiler"].write_trace(trace_file)
+        return df_copy, execution["profiler"].report()
+    return df_copy
+
+#----------------------------------------------------------------Explain----------------------------------------------------------------
+"""
+explain validates the instructions file, applies each instruction (not fused) to a random sample of sample rows of df and
+extrapolates the time of each one to all the rows of df, to know how long the preprocessing will take before launching it.
+The column "mode" tells how the instruction will be applied by preprocessing:
+- "vectorized": with the str methods of pandas on the whole column (for EXTRACT_REGEX_PATTERN: once per distinct text, with
+  the numbers converted all at once).
+- "per-row": with its per-cell function.
+- "per-word (vocabulary)": once per distinct word of the columns, the cells are rebuilt from the results of their words.
+- "corpus": REMOVE_FREQUENT and REMOVE_RARE, which count the words of the whole column.
+The estimation is linear in the number of rows: it is too high for the columns with few distinct values (see dedup_ratio)
+and for the "per-word" instructions (the vocabulary grows slower than the number of rows), and the words counted by REMOVE_FREQUENT and REMOVE_RARE on the sample are not the ones of the whole dataframe.
+Returns the report (dataframe) of the profiler with the columns "mode" and "estimated_seconds" added.
+"""
+# how each instruction of the plans will be applied. The object columns are followed from stage to stage: all the per-cell
+# functions return strings except the ones converting to dates and extracting regex patterns
+def instruction_modes(plans, df):
+    modes = {}
+    strings = {column: is_object_column(df[column]) for column in df.columns}
+    for target, plan in plans:
+        columns_to_process = target_columns(target, df)
+        for stage in plan:
+            if stage["kind"] == "corpus":
+                modes[(target, stage["names"][0])] = "corpus"
+                if "apply" in stage["arguments"].keys():
+                    strings.update({column: True for column in columns_to_process})
+            elif stage["kind"] == "extract":
+                for extract in stage["extracts"]:
+                    modes[(target, extract["names"][0])] = "per-row" if extract["extractor"] is None else "vectorized"
+                strings.update({column: False for column in stage["new_column_name"]})
+            else:
+                for segment in stage["segments"]:
+                    for name, instruction, dict_instruction in segment["instructions"]:
+                        if segment["vectorized"] and all(strings.get(column, False) for column in columns_to_process):
+                            modes[(target, name)] = "vectorized"
+                        elif segment["vectorized"]:
+                            modes[(target, name)] = "per-row (column not of object dtype)"
+                        elif segment["vocabulary"]:
+                            modes[(target, name)] = "per-word (vocabulary)"
+                        else:
+                            modes[(target, name)] = "per-row"
+                    last_instruction = segment["instructions"][-1][1]
+                    only_strings = last_instruction not in ["CONVERT_TO_DATE_OR_DATETIME", "EXTRACT_REGEX_PATTERN"]
+                    strings.update({column: only_strings for column in columns_to_process})
+    return modes
+
+def explain(instructions_file, df, sample=500, random_state=None, optimize=False):
+
+    # check the instructions
+    check_instructions(dict_check_instructions, instructions_file, df)
+
+    dict_json = load_instructions(instructions_file)
+    df_sample = df.sample(n=min(sample, len(df)), random_state=random_state)
+    modes = instruction_modes(build_plans(dict_json, optimize=optimize), df)
+
+    # apply each instruction to the sample
+    execution = create_execution(verbose=False, profile=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        apply_plans(build_plans(dict_json, fuse=False, optimize=optimize), df_sample, execution)
+    report = execution["profiler"].report()
+
+    report["mode"] = [modes[(target, instruction)] for target, instruction in zip(report["target"], report["instruction"])]
+    report["estimated_seconds"] = report["seconds"] * len(df) / max(len(df_sample), 1)
+    report = report[["target", "instruction", "mode", "seconds", "rows", "estimated_seconds"]]
+
+    print(report.to_string(index=False))
+    total = report["estimated_seconds"].sum()
+    print(f"Estimated time for {len(df)} rows: {datetime.timedelta(seconds=round(total))} ({total:.1f} seconds)")
+
+    return report
+
+#-------------------------------------------------------------Streaming CSV-------------------------------------------------------------
+"""
+preprocessing_csv reads a csv file by chunks of rows_per_chunk rows, applies the instructions to each chunk and appends
+the result to output_file, so the memory used depends on rows_per_chunk and not on the size of the file.
+The csv parser of pandas handles the quoted fields written on several lines (like the reviews).
+REMOVE_FREQUENT and REMOVE_RARE need the word counts of the whole column: for each of them, the file is read once more
+beforehand to count the words of the column as they are at this step, and the words to remove are then the same for all
+the chunks (same result as preprocessing on the whole file).
+Other arguments of pd.read_csv (sep, dtype, ...) can be given in read_csv_arguments. By default all the columns are read
+as strings (dtype=str), otherwise pandas guesses the type of each column chunk by chunk and two chunks could get different
+types for the same column (ex: int in a chunk and float in another one because of a missing value).
+"""
+# count the words of all the chunks for each REMOVE_FREQUENT and REMOVE_RARE of the plans and keep the words to remove in
+# the stages. chunks() returns a new iterator over the chunks each time (they are modified by the instructions)
+def count_corpus_words(plans, chunks, execution):
+    for target, plan in plans:
+        for stage in plan:
+            if stage["kind"] != "corpus":
+                continue
+            print(f"Counting the words for the instruction {stage['names'][0]}...")
+            counters = OrderedDict()
+            for chunk in chunks():
+                columns_to_process = apply_plans(plans, chunk, execution, until=stage)
+                for column in columns_to_process:
+                    if column not in counters.keys():
+                        counters[column] = create_word_counter(stage)
+                    count_corpus_words_column(chunk[column], counters[column], stage, execution)
+            nb_words = int(stage["arguments"]["nb_words"])
+            stage["words_to_remove"] = {column: select_freq_or_rare_words(count_words, column, stage["instruction"], nb_words) for column, count_words in counters.items()}
+
+# read the csv file by chunks
+def read_csv_chunks(input_file, rows_per_chunk, read_csv_arguments):
+    return pd.read_csv(input_file, chunksize=rows_per_chunk, **read_csv_arguments)
+
+def preprocessing_csv(instructions_file, input_file, output_file, rows_per_chunk=10000, workers=1, chunksize=None, cache=None, dedup_ratio=0.5, **read_csv_arguments):
+
+    read_csv_arguments.setdefault("dtype", str)
+    # check the instructions with the columns of the file
+    header = pd.read_csv(input_file, nrows=0, **read_csv_arguments)
+    check_instructions(dict_check_instructions, instructions_file, header)
+
+    dict_json = load_instructions(instructions_file)
+    plans = build_plans(dict_json)
+
+    execution = create_execution(workers, chunksize, rows_per_chunk, cache, dedup_ratio, verbose=False)
+    try:
+        # count the words of the whole file for each REMOVE_FREQUENT and REMOVE_RARE
+        count_corpus_words(plans, lambda: read_csv_chunks(input_file, rows_per_chunk, read_csv_arguments), execution)
+
+        # apply the instructions chunk by chunk and append the result to the output file
+        nb_rows = 0
+        for i, chunk in enumerate(read_csv_chunks(input_file, rows_per_chunk, read_csv_arguments)):
+            apply_plans(plans, chunk, execution)
+            chunk.to_csv(output_file, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            nb_rows += len(chunk)
+            print(f"{nb_rows} rows written in {output_file}")
+    finally:
+        close_execution(execution)
+
+    print("All instructions have been applied.")
+
+#--------------------------------------------------------Incremental preprocessing-----------------------------------------------------
+"""
+preprocessing_incremental applies the instructions only to the rows of df that are new or changed since the last run and
+merges them with the rows already preprocessed in output_file.
+A manifest (json file, output_file + ".manifest.json" by default) keeps:
+- the hash of the instructions file: if the file changed, everything is preprocessed again.
+- the key of each row of the output (values of key_columns, or the index of df if key_columns is None) and the hash of
+  its values in df, to find the new and changed rows. The rows that are no longer in df are removed from the output.
+- the words removed by REMOVE_FREQUENT and REMOVE_RARE: they are counted only when everything is preprocessed and the
+  same words are removed from the new rows. Use rebuild=True to preprocess everything and count them again.
+The rows of the output are in the order of df. In the returned dataframe, the rows taken from output_file have strings
+as values (as read in the csv file).
+"""
+# hash of the content of a file
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+# keys of the rows of the dataframe
+def row_keys(df, key_columns):
+    if key_columns is None:
+        return [json.dumps(str(key)) for key in df.index]
+    return [json.dumps([str(value) for value in row]) for row in df[key_columns].itertuples(index=False)]
+
+# hash of the values of each row of the dataframe
+def row_hashes(df):
+    return [hashlib.sha256(json.dumps([str(value) for value in row]).encode("utf-8", "surrogatepass")).hexdigest() for row in df.itertuples(index=False)]
+
+# words to remove of the corpus stages of the plans, the keys are "target index/stage index"
+def corpus_words(plans):
+    words = {}
+    for t, (target, plan) in enumerate(plans):
+        for s, stage in enumerate(plan):
+            if stage["kind"] == "corpus":
+                words[f"{t}/{s}"] = stage.get("words_to_remove", {})
+    return words
+
+def preprocessing_incremental(instructions_file, df, output_file, key_columns=None, manifest_file=None, rebuild=False, workers=1, chunksize=None, cache=None, dedup_ratio=0.5):
+
+    # check the instructions
+    check_instructions(dict_check_instructions, instructions_file, df)
+
+    if manifest_file is None:
+        manifest_file = output_file + ".manifest.json"
+    instructions_hash = file_hash(instructions_file)
+    keys = row_keys(df, key_columns)
+    hashes = row_hashes(df)
+    if len(set(keys)) != len(keys):
+        print("Error: the keys of the rows are not unique.")
+        sys.exit(1)
+
+    manifest = None
+    if not rebuild and os.path.isfile(manifest_file) and os.path.isfile(output_file):
+        with open(manifest_file, 'r') as json_file:
+            manifest = json.load(json_file)
+        if manifest["instructions_hash"] != instructions_hash:
+            print("The instructions file changed, all the rows are preprocessed again.")
+            manifest = None
+
+    plans = build_plans(load_instructions(instructions_file))
+    if manifest is None:
+        rows_to_process = list(range(len(df)))
+    else:
+        hash_by_key = dict(zip(manifest["keys"], manifest["hashes"]))
+        rows_to_process = [i for i, (key, row_hash) in enumerate(zip(keys, hashes)) if hash_by_key.get(key) != row_hash]
+        # the words of REMOVE_FREQUENT and REMOVE_RARE of the last full run
+        for t, (target, plan) in enumerate(plans):
+            for s, stage in enumerate(plan):
+                if stage["kind"] == "corpus":
+                    stage["words_to_remove"] = manifest["words_to_remove"].get(f"{t}/{s}", {})
+    print(f"{len(rows_to_process)} rows to preprocess out of {len(df)}.")
+
+    df_copy = df.iloc[rows_to_process].copy()
+    execution = create_execution(workers, chunksize, len(df_copy), cache, dedup_ratio)
+    try:
+        apply_plans(plans, df_copy, execution)
+    finally:
+        close_execution(execution)
+
+    # merge the new rows with the rows of the previous output that didn't change
+    if manifest is None:
+        df_output = df_copy
+    else:
+        # read as written (strings, empty cells kept as ""), so the rows that didn't change are written again unchanged
+        df_previous = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+        position_by_key = {key: i for i, key in enumerate(manifest["keys"])}
+        processed = set(rows_to_process)
+        previous_rows = [position_by_key[key] for i, key in enumerate(keys) if i not in processed]
+        df_output = pd.concat([df_previous.iloc[previous_rows], df_copy])
+        # put the rows back in the order of df
+        order = [i for i in range(len(df)) if i not in processed] + rows_to_process
+        df_output.index = order
+        df_output = df_output.sort_index()
+        df_output.index = df.index
+    df_output.to_csv(output_file, index=False)
+
+    manifest = {"instructions_hash": instructions_hash, "keys": keys, "hashes": hashes,
+                "words_to_remove": corpus_words(plans) if manifest is None else manifest["words_to_remove"]}
+    with open(manifest_file, 'w') as json_file:
+        json.dump(manifest, json_file)
+
     print("All instructions have been applied.")
 
-    return df_copy        
\ No newline at end of file
+    return df_output
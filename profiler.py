@@ -0,0 +1,97 @@
+import time
+import json
+import pandas as pd
+try:
+    import resource
+except ImportError:
+    # not available on Windows, the peak memory is not measured
+    resource = None
+
+"""
+Profiler of the preprocessing, used by preprocessing(..., profile=True).
+
+For each target and instruction it records:
+- seconds: wall time of the instruction.
+- rows: number of rows processed.
+- rows_per_second: rows / seconds.
+- bytes_in: memory used by the columns read by the instruction before it runs.
+- bytes_out: memory used by the columns written by the instruction after it runs.
+- peak_rss_delta_kb: increase of the peak memory of the process during the instruction (kilobytes, None on Windows).
+An instruction applied several times to the same target (ex: on each chunk) has one line with the sums (and the biggest
+increase of peak memory).
+
+The report is a dataframe (report()) or a list of dictionaries (to_json()). write_trace writes the instructions in the
+trace event format of chrome://tracing, which can be opened as a flame graph in chrome://tracing, Perfetto or speedscope.
+
+Example Usage:
+new_df, report = preprocessing("instructions.json", df, profile=True, trace_file="trace.json")
+print(report.sort_values("seconds", ascending=False))
+"""
+
+
+# peak memory of the process in kilobytes
+def peak_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# memory used by columns of a dataframe in bytes
+def columns_bytes(df, columns):
+    columns = [column for column in columns if column in df.columns]
+    if not columns:
+        return 0
+    return int(df[columns].memory_usage(index=False, deep=True).sum())
+
+
+class Profiler:
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.measures = []
+
+    # run a stage of the plan and measure it, run_function applies the stage
+    def run(self, target, stage, df, columns_in, columns_out, run_function):
+        bytes_in = columns_bytes(df, columns_in)
+        rss_before = peak_rss()
+        start = time.perf_counter()
+        run_function()
+        end = time.perf_counter()
+        rss_after = peak_rss()
+        self.measures.append({"target": target,
+                              "instruction": "+".join(stage["names"]),
+                              "start": start - self.start_time,
+                              "seconds": end - start,
+                              "rows": len(df),
+                              "bytes_in": bytes_in,
+                              "bytes_out": columns_bytes(df, columns_out),
+                              "peak_rss_delta_kb": None if rss_before is None else rss_after - rss_before})
+
+    # one line per target and instruction, in the order of the first run
+    def report(self):
+        columns = ["target", "instruction", "seconds", "rows", "rows_per_second", "bytes_in", "bytes_out", "peak_rss_delta_kb"]
+        if not self.measures:
+            return pd.DataFrame(columns=columns)
+        measures = pd.DataFrame(self.measures)
+        report = measures.groupby(["target", "instruction"], sort=False).agg({"seconds": "sum", "rows": "sum", "bytes_in": "sum",
+                                                                             "bytes_out": "sum", "peak_rss_delta_kb": "max"}).reset_index()
+        report["rows_per_second"] = report["rows"] / report["seconds"].where(report["seconds"] > 0)
+        return report[columns]
+
+    def to_json(self):
+        return json.loads(self.report().to_json(orient="records"))
+
+    # write the measures in the trace event format (complete events, times in microseconds)
+    def write_trace(self, trace_file):
+        events = []
+        threads = {}
+        for measure in self.measures:
+            # one line of the trace per target
+            thread = threads.setdefault(measure["target"], len(threads))
+            events.append({"name": measure["instruction"], "cat": measure["target"], "ph": "X", "pid": 0, "tid": thread,
+                           "ts": measure["start"] * 1e6, "dur": measure["seconds"] * 1e6,
+                           "args": {"rows": measure["rows"], "bytes_in": measure["bytes_in"], "bytes_out": measure["bytes_out"]}})
+        for target, thread in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 0, "tid": thread, "args": {"name": target}})
+        with open(trace_file, 'w') as file:
+            json.dump({"traceEvents": events}, file)
@@ -0,0 +1,137 @@
+import math
+import hashlib
+import numpy as np
+
+"""
+Approximate word counts with a fixed memory, used by REMOVE_FREQUENT and REMOVE_RARE with {"mode": "approximate"} when
+they only print the words (without "apply").
+
+- MisraGries keeps at most capacity words with a count. The words are added by batches (Counter of a chunk of rows):
+  when there are more than capacity words, the count of the (capacity + 1)th word is subtracted from all the counts and
+  the words at 0 or less are removed. The count of a word is under its real count by at most the sum of the subtractions
+  (error), which is at most total / (capacity + 1). Every word with a real count bigger than the error is kept.
+- CountMinSketch adds the count of each word to one cell in each of the depth rows of a table of width cells. The
+  estimate of a word (smallest of its cells) is over its real count by at most e * total / width with a probability of
+  1 - exp(-depth). To find the rare words, it also keeps the capacity words with the smallest estimates seen so far.
+
+Both have update(counts), to add a Counter of words, and merge(other), to add the counts of another sketch of the same
+size (ex: computed on another chunk of the file or by another process). The hashes of the words don't depend on the process.
+
+Example Usage:
+sketch = MisraGries(1000)
+sketch.update(Counter(text.split(" ")))
+sketch.most_common(10)
+"""
+
+
+class MisraGries:
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = {}
+        self.total = 0
+        self.error = 0
+
+    # add a dictionary word -> count
+    def update(self, counts):
+        for word, count in counts.items():
+            self.counts[word] = self.counts.get(word, 0) + count
+            self.total += count
+        self.reduce()
+
+    # add the counts of another sketch
+    def merge(self, other):
+        for word, count in other.counts.items():
+            self.counts[word] = self.counts.get(word, 0) + count
+        self.total += other.total
+        self.error += other.error
+        self.reduce()
+
+    # keep at most capacity words
+    def reduce(self):
+        if len(self.counts) <= self.capacity:
+            return
+        subtracted = sorted(self.counts.values(), reverse=True)[self.capacity]
+        self.counts = {word: count - subtracted for word, count in self.counts.items() if count > subtracted}
+        self.error += subtracted
+
+    # the nb_words words with the biggest counts, with their count (under the real count by at most self.error)
+    def most_common(self, nb_words):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:nb_words]
+
+
+# position of a word in each row of a count-min sketch, from a hash that doesn't depend on the process
+def word_positions(word, width, depth):
+    digest = hashlib.blake2b(word.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    return [(first + row * second) % width for row in range(depth)]
+
+
+class CountMinSketch:
+
+    def __init__(self, width=10000, depth=4, capacity=10000):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.rows = np.arange(depth)
+        self.total = 0
+        # words that can be among the rarest ones, with their positions in the table
+        self.candidates = {}
+
+    # estimated counts of words from the list of their positions
+    def estimate_positions(self, all_positions):
+        return self.table[self.rows[:, None], np.array(all_positions).T].min(axis=0)
+
+    def estimate(self, word):
+        return int(self.estimate_positions([word_positions(word, self.width, self.depth)])[0])
+
+    # the candidates with their estimated count
+    def candidates_estimates(self):
+        if not self.candidates:
+            return []
+        return list(zip(self.candidates.keys(), self.estimate_positions(list(self.candidates.values())).tolist()))
+
+    # add a dictionary word -> count
+    def update(self, counts):
+        if not counts:
+            return
+        all_positions = []
+        for word in counts.keys():
+            positions = self.candidates.get(word)
+            if positions is None:
+                positions = word_positions(word, self.width, self.depth)
+                self.candidates[word] = positions
+            all_positions.append(positions)
+        # all the words are added to the table at once
+        np.add.at(self.table, (self.rows[:, None], np.array(all_positions).T), np.array(list(counts.values()), dtype=np.int64))
+        self.total += sum(counts.values())
+        self.reduce()
+
+    # add the counts of another sketch with the same width and depth
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        for word, positions in other.candidates.items():
+            self.candidates.setdefault(word, positions)
+        self.reduce()
+
+    # keep the capacity words with the smallest estimates
+    def reduce(self):
+        if len(self.candidates) <= self.capacity:
+            return
+        estimates = sorted(self.candidates_estimates(), key=lambda item: item[1])
+        self.candidates = {word: self.candidates[word] for word, estimate in estimates[:self.capacity]}
+
+    # the biggest over-estimation of a count with a probability of confidence
+    def error(self):
+        return math.e * self.total / self.width
+
+    def confidence(self):
+        return 1 - math.exp(-self.depth)
+
+    # the nb_words words with the smallest estimates among the candidates, sorted from the biggest estimate to the smallest
+    # like the end of Counter.most_common
+    def least_common(self, nb_words):
+        estimates = sorted(self.candidates_estimates(), key=lambda item: item[1], reverse=True)
+        return estimates[-nb_words:] if nb_words > 0 else []
@@ -0,0 +1,194 @@
+import os
+import pickle
+import unicodedata
+from spellchecker import SpellChecker
+
+"""
+Spell checker with a symmetric delete index (SymSpell), used by SPELL_CORRECTION with {"method": "symspell"}.
+
+pyspellchecker generates all the strings at one or two edits of a misspelled word (several hundred thousand for a long
+word) and keeps the ones that are in its dictionary. Here the index is computed once from the same dictionary: each
+string obtained by deleting up to MAX_DISTANCE characters from the first PREFIX_LENGTH characters of a word points to
+this word. To correct a word, the same deletes are computed for the word (a few dozen strings) and looked up in the index,
+which gives the words of the dictionary that can be at MAX_DISTANCE edits or less. Their real distance (insertions,
+deletions, substitutions and transpositions of two adjacent characters) is then computed and the correction is chosen as
+with pyspellchecker: the words at the smallest distance, preferably the ones that only differ by their accents, and among
+them the most frequent one. When several words have the same frequency, the first one in alphabetical order is chosen
+(pyspellchecker takes any of them).
+The index is saved with pickle in index_file, by default in the cache directory of the user (see default_index_file), so
+it is built only once: building it takes a few seconds and loading it is faster. It is built again if the file was made
+with another version of the index. If the file can't be written, the index is only kept in memory.
+
+unknown and correction work like the methods of pyspellchecker, so both spell checkers can be used by correct_spellings_tokens.
+
+Example Usage:
+spell = SymSpellChecker.load_or_build()
+spell.correction("speling")
+"""
+
+INDEX_VERSION = 1
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+
+# strings obtained by deleting up to distance characters from a word (including the word itself)
+def deletes(word, distance):
+    result = {word}
+    edits = {word}
+    for _ in range(distance):
+        edits = deletes_one(edits)
+        result.update(edits)
+    return result
+
+
+# strings obtained by deleting one character from strings
+def deletes_one(words):
+    return {word[:i] + word[i + 1:] for word in words for i in range(len(word))}
+
+
+# number of insertions, deletions, substitutions and transpositions of two adjacent characters to go from a word to another
+# (optimal string alignment distance), stops and returns max_distance + 1 when the distance is bigger than max_distance
+def edit_distance(word, other, max_distance):
+    # the characters at the beginning and at the end that are the same in both words don't change the distance
+    start = 0
+    while start < len(word) and start < len(other) and word[start] == other[start]:
+        start += 1
+    end = 0
+    while end < len(word) - start and end < len(other) - start and word[-1 - end] == other[-1 - end]:
+        end += 1
+    word = word[start:len(word) - end]
+    other = other[start:len(other) - end]
+    if abs(len(word) - len(other)) > max_distance:
+        return max_distance + 1
+    if not word or not other:
+        return max(len(word), len(other))
+    # only the cells at max_distance or less from the diagonal are computed, the others are bigger than max_distance
+    too_far = max_distance + 1
+    previous_previous = None
+    previous = [j if j <= max_distance else too_far for j in range(len(other) + 1)]
+    for i in range(1, len(word) + 1):
+        current = [too_far] * (len(other) + 1)
+        if i <= max_distance:
+            current[0] = i
+        first, last = max(1, i - max_distance), min(len(other), i + max_distance)
+        for j in range(first, last + 1):
+            cost = 0 if word[i - 1] == other[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and word[i - 1] == other[j - 2] and word[i - 2] == other[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current[first - 1:last + 1]) > max_distance:
+            return too_far
+        previous_previous, previous = previous, current
+    return min(previous[-1], too_far)
+
+
+# word without its accents
+def remove_diacritics(word):
+    return "".join(character for character in unicodedata.normalize("NFKD", word) if not unicodedata.combining(character))
+
+
+# default file of the index, in the cache directory of the user (XDG_CACHE_HOME or ~/.cache)
+def default_index_file():
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "nlp_project", "spell_index.pkl")
+
+
+class SymSpellChecker:
+
+    def __init__(self, frequencies, index):
+        self.frequencies = frequencies
+        self.index = index
+        self.longest_word_length = max((len(word) for word in frequencies.keys()), default=0)
+
+    # build the index from the english dictionary of pyspellchecker
+    @classmethod
+    def build(cls):
+        frequencies = dict(SpellChecker()._word_frequency.dictionary)
+        index = {}
+        for word in frequencies.keys():
+            for delete in deletes(word[:PREFIX_LENGTH], MAX_DISTANCE):
+                index.setdefault(delete, []).append(word)
+        return cls(frequencies, index)
+
+    # load the index from index_file (default_index_file() if None), or build it and save it in index_file if the file doesn't
+    # exist or is from another version
+    @classmethod
+    def load_or_build(cls, index_file=None):
+        if index_file is None:
+            index_file = default_index_file()
+        if os.path.exists(index_file):
+            with open(index_file, 'rb') as file:
+                content = pickle.load(file)
+            if content["version"] == INDEX_VERSION:
+                return cls(content["frequencies"], content["index"])
+
+        spell = cls.build()
+        # written in a temporary file of the process first so that the index is never half written, even when several
+        # processes build it at the same time
+        temporary_file = f"{index_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+            with open(temporary_file, 'wb') as file:
+                pickle.dump({"version": INDEX_VERSION, "frequencies": spell.frequencies, "index": spell.index}, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file, index_file)
+        except OSError:
+            pass
+        return spell
+
+    # check if a word has to be checked (same rules as pyspellchecker: no punctuation character, no number, not too long)
+    def should_check(self, word):
+        if len(word) == 1 and word in "!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~":
+            return False
+        if len(word) > self.longest_word_length + 3:
+            return False
+        if word.lower() in ("nan", "inf", "infinity"):
+            return True
+        try:
+            float(word)
+            return False
+        except ValueError:
+            return True
+
+    # the words (lowercased) that are not in the dictionary
+    def unknown(self, words):
+        words = [word.lower() for word in words if self.should_check(word)]
+        return {word for word in words if word not in self.frequencies}
+
+    # the most probable correction of a word, None if there is no word of the dictionary close enough
+    def correction(self, word):
+        word = word.lower()
+        if word in self.frequencies or not self.should_check(word):
+            return word
+
+        # the words at distance d of the word are found with the deletes of up to d characters of the word, so the deletes
+        # of d characters are not looked up when a word at a distance smaller than d was already found
+        best_distance = MAX_DISTANCE + 1
+        best_candidates = []
+        checked = set()
+        word_deletes = {word[:PREFIX_LENGTH]}
+        for nb_deletes in range(MAX_DISTANCE + 1):
+            if best_distance < nb_deletes:
+                break
+            if nb_deletes > 0:
+                word_deletes = deletes_one(word_deletes)
+            for delete in word_deletes:
+                for candidate in self.index.get(delete, []):
+                    if candidate in checked:
+                        continue
+                    checked.add(candidate)
+                    if abs(len(candidate) - len(word)) > min(best_distance, MAX_DISTANCE):
+                        continue
+                    distance = edit_distance(word, candidate, min(best_distance, MAX_DISTANCE))
+                    if distance < best_distance:
+                        best_distance = distance
+                        best_candidates = [candidate]
+                    elif distance == best_distance and distance <= MAX_DISTANCE:
+                        best_candidates.append(candidate)
+        if not best_candidates:
+            return None
+
+        word_without_accents = remove_diacritics(word)
+        same_letters = [candidate for candidate in best_candidates if remove_diacritics(candidate) == word_without_accents]
+        if same_letters:
+            best_candidates = same_letters
+        return min(best_candidates, key=lambda candidate: (-self.frequencies[candidate], candidate))
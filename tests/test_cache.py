@@ -0,0 +1,78 @@
+import json
+import time
+import pickle
+import pandas as pd
+import cache
+from cache import PreprocessingCache
+from preprocessing import preprocessing
+
+INSTRUCTIONS = [["LOWERCASE", "LOWERCASE", {}], ["REMOVE_PUNCT", "REMOVE_PUNCT", {}]]
+
+
+# compute function that records the texts it is given
+def recording_compute(calls):
+    def compute(texts):
+        calls.append(list(texts))
+        return [text.lower() for text in texts]
+    return compute
+
+
+# only the texts that are not in the cache are computed, the results are in the order of the texts
+def test_cache_hit(tmp_path):
+    preprocessing_cache = PreprocessingCache(str(tmp_path / "cache.sqlite"))
+    calls = []
+    assert preprocessing_cache.map(INSTRUCTIONS, [["A", "B"], ["A"]], recording_compute(calls)) == [["a", "b"], ["a"]]
+    assert preprocessing_cache.map(INSTRUCTIONS, [["C", "B", "A"]], recording_compute(calls)) == [["c", "b", "a"]]
+    assert calls == [["A", "B"], ["C"]]
+    preprocessing_cache.close()
+
+    # the results are kept in the file
+    preprocessing_cache = PreprocessingCache(str(tmp_path / "cache.sqlite"))
+    assert preprocessing_cache.map(INSTRUCTIONS, [["A", "B", "C"]], recording_compute(calls)) == [["a", "b", "c"]]
+    assert len(calls) == 2
+    # other arguments are another stage
+    preprocessing_cache.map([["REMOVE_PUNCT", "REMOVE_PUNCT", {"punctuation": "!"}]], [["A"]], recording_compute(calls))
+    assert calls[-1] == ["A"]
+    preprocessing_cache.close()
+
+
+# the results used the least recently are removed when the file is bigger than max_size
+def test_cache_eviction(tmp_path):
+    texts = [f"TEXT {i} " + "x" * 20 for i in range(20)]
+    batch_size = sum(len(pickle.dumps(text.lower())) for text in texts[:10])
+    preprocessing_cache = PreprocessingCache(str(tmp_path / "cache.sqlite"), max_size=batch_size + 10)
+    calls = []
+    preprocessing_cache.map(INSTRUCTIONS, [texts[:10]], recording_compute(calls))
+    time.sleep(0.01)
+    preprocessing_cache.map(INSTRUCTIONS, [texts[10:]], recording_compute(calls))
+    size = preprocessing_cache.connection.execute("SELECT SUM(size) FROM results").fetchone()[0]
+    assert size <= batch_size + 10
+    # the last texts are still there, the first ones are computed again
+    calls.clear()
+    preprocessing_cache.map(INSTRUCTIONS, [texts[10:]], recording_compute(calls))
+    assert calls == []
+    preprocessing_cache.map(INSTRUCTIONS, [texts[:10]], recording_compute(calls))
+    assert calls == [texts[:10]]
+    preprocessing_cache.close()
+
+
+# the results of another version of the cache are not used
+def test_cache_version(tmp_path, monkeypatch):
+    preprocessing_cache = PreprocessingCache(str(tmp_path / "cache.sqlite"))
+    calls = []
+    preprocessing_cache.map(INSTRUCTIONS, [["A"]], recording_compute(calls))
+    monkeypatch.setattr(cache, "CACHE_VERSION", cache.CACHE_VERSION + 1)
+    preprocessing_cache.map(INSTRUCTIONS, [["A"]], recording_compute(calls))
+    assert calls == [["A"], ["A"]]
+    preprocessing_cache.close()
+
+
+# a run with the cache, empty then full, gives the result of a run without it
+def test_cache_preprocessing(tmp_path):
+    df = pd.DataFrame({"Review": ["Good FOOD!", "Bad <b>service</b> :(", float("nan"), "ok \U0001F600"] * 5, "Rating": ["5", "1", "3", "4"] * 5})
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps({"Review": {"REMOVE_HTML": {}, "CONVERT_EMOJIS": {}, "CONVERT_EMOTICONS": {}, "REMOVE_STOPWORDS": {}}}))
+    expected = preprocessing(str(instructions_file), df)
+    for options in [{}, {}, {"workers": 2}, {"dedup_ratio": 0}]:
+        result = preprocessing(str(instructions_file), df, cache=str(tmp_path / "cache.sqlite"), **options)
+        pd.testing.assert_frame_equal(result, expected)
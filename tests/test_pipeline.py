@@ -0,0 +1,42 @@
+import os
+import json
+import pandas as pd
+from pipeline import Pipeline
+from preprocessing import preprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# pipeline of an instructions dictionary written in a json file, with the result of the eager preprocessing
+def pipeline_and_expected(tmp_path, dict_json, df, **options):
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps(dict_json))
+    return Pipeline.from_json(str(instructions_file), verbose=False, **options), preprocessing(str(instructions_file), df)
+
+
+# collect, select, head and the chunks give the rows and columns of the eager preprocessing
+def test_lazy_frame(tmp_path):
+    df = pd.read_csv(os.path.join(ROOT, "Restaurant reviews.csv")).head(300)
+    dict_json = {"Review": {"REMOVE_HTML": {}, "LOWERCASE": {}, "REMOVE_PUNCT": {}, "REMOVE_STOPWORDS": {}},
+                 "Reviewer": {"LOWERCASE": {}},
+                 "Metadata": {"EXTRACT_REGEX_PATTERN": {"regex_pattern": "(\\d+) Review", "new_column_name": ["nb_review"], "result_type": "int"}}}
+    for options in [{}, {"workers": 2, "chunksize": 40}]:
+        pipeline, expected = pipeline_and_expected(tmp_path, dict_json, df, **options)
+        lazy_frame = pipeline.transform(df)
+        pd.testing.assert_frame_equal(lazy_frame.collect(), expected)
+        pd.testing.assert_frame_equal(lazy_frame.select(["Review", "nb_review"]).head(50).collect(), expected[["Review", "nb_review"]].head(50))
+        pd.testing.assert_frame_equal(lazy_frame.head(80).select(["Rating"]).collect(), expected[["Rating"]].head(80))
+        chunks = list(lazy_frame.select(["Reviewer"]).iter_chunks(70))
+        assert [len(chunk) for chunk in chunks] == [70, 70, 70, 70, 20]
+        pd.testing.assert_frame_equal(pd.concat(chunks), expected[["Reviewer"]])
+
+
+# REMOVE_FREQUENT and REMOVE_RARE count the words of all the rows, also with head and the chunks
+def test_lazy_frame_corpus(tmp_path):
+    df = pd.read_csv(os.path.join(ROOT, "Restaurant reviews.csv")).head(300)
+    dict_json = {"Review": {"LOWERCASE": {}, "REMOVE_FREQUENT": {"nb_words": 10, "apply": "-e"}, "REMOVE_RARE": {"nb_words": 50, "apply": "-e"}}}
+    pipeline, expected = pipeline_and_expected(tmp_path, dict_json, df)
+    lazy_frame = pipeline.transform(df)
+    pd.testing.assert_frame_equal(lazy_frame.head(20).collect(), expected.head(20))
+    pd.testing.assert_frame_equal(pd.concat(list(lazy_frame.iter_chunks(100))), expected)
+    pd.testing.assert_frame_equal(pd.concat(list(lazy_frame.select(["Review"]))), expected[["Review"]])
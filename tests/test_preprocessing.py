@@ -0,0 +1,262 @@
+import os
+import json
+import datetime
+import warnings
+import pytest
+import pandas as pd
+import preprocessing as preprocessing_module
+from preprocessing import preprocessing, preprocessing_csv, preprocessing_incremental, remove_emoticons, convert_emoticons, convert_to_date_or_datetime, \
+    convert_to_date_or_datetime_texts, convert_to_date_or_datetime_format, infer_date_format, cell_function, build_plans, instruction_modes, optimize_instructions
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# run an instructions dictionary on a dataframe through a json file
+def run_instructions(tmp_path, dict_json, df, **options):
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps(dict_json))
+    return preprocessing(str(instructions_file), df, **options)
+
+
+# a column of lists (default result_type of EXTRACT_REGEX_PATTERN) read by a next extraction
+def test_extract_from_list_column(tmp_path):
+    df = pd.DataFrame({"Metadata": ["1 Review , 2 Followers", "3 Reviews , 2 Followers"] * 5})
+    dict_json = {"Metadata": {"EXTRACT_REGEX_PATTERN": {"regex_pattern": "\\d+"},
+                              "EXTRACT_REGEX_PATTERN_2": {"regex_pattern": "\\d+", "new_column_name": ["n"], "result_type": "int"}}}
+    for options in [{}, {"dedup_ratio": 0}]:
+        result = run_instructions(tmp_path, dict_json, df, **options)
+        assert result["Metadata"].tolist() == [["1", "2"], ["3", "2"]] * 5
+        assert result["n"].tolist() == [1, 3] * 5
+
+
+# cells with lists and dictionaries under ALL with a per-cell instruction
+def test_unhashable_cells(tmp_path):
+    df = pd.DataFrame({"a": [["x", "\U0001f600"]] * 6 + [{"k": "v"}] * 4, "b": ["Hi"] * 10})
+    result = run_instructions(tmp_path, {"ALL": {"CONVERT_EMOJIS": {}}}, df)
+    assert result["a"].tolist() == ["['x', 'grinning_face']"] * 6 + ["{'k': 'v'}"] * 4
+    assert result["b"].tolist() == ["Hi"] * 10
+
+
+# emoticons written with a character class in EMOTICONS (":[(\\)]", "=[(\\)]", ">:[(\\)]", ":-[.]")
+def test_emoticon_character_classes():
+    for emoticon in ["=(", "=)", ":\\", "=\\", ">:\\", ">:(", ":-."]:
+        assert remove_emoticons(f"meh {emoticon} x") == "meh  x"
+        assert convert_emoticons(f"meh {emoticon} x") != f"meh {emoticon} x"
+    assert convert_emoticons("=(") == "Skeptical_annoyed_undecided_uneasy_or_hesitant"
+    assert convert_emoticons("=)") == "Happy_face_smiley"
+    assert remove_emoticons("((d-b)) ((d_b))") == " "
+
+
+# a second incremental run writes the same file as a full run, including the rows read back from the previous output
+def test_incremental_rewrites_same_file(tmp_path):
+    df = pd.DataFrame({"Review": ["Good FOOD!", "", "nan", "Bad."] * 5, "Rating": ["5", "1", "Like", "3"] * 5, "Score": [1.5, None, 2.0, 3.0] * 5})
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps({"Review": {"LOWERCASE": {}, "REMOVE_PUNCT": {}}}))
+    full_file, incremental_file = tmp_path / "full.csv", tmp_path / "incremental.csv"
+    preprocessing_incremental(str(instructions_file), df, str(full_file))
+    preprocessing_incremental(str(instructions_file), df.iloc[:12], str(incremental_file))
+    preprocessing_incremental(str(instructions_file), df, str(incremental_file))
+    preprocessing_incremental(str(instructions_file), df, str(incremental_file))
+    assert incremental_file.read_bytes() == full_file.read_bytes()
+
+
+# the "exact" optimizer gives the same result as the order of the instructions file (capital sigma before punctuation and html)
+def test_exact_optimizer_capital_sigma(tmp_path):
+    df = pd.DataFrame({"Review": ["ΑΣ!Β", "ΑΣ<b>Β", "ΟΔΟΣ. Good"]})
+    dict_json = {"Review": {"REMOVE_HTML": {}, "LOWERCASE": {}, "REMOVE_PUNCT": {}}}
+    expected = run_instructions(tmp_path, dict_json, df)
+    assert expected["Review"].tolist() == ["αςβ", "ασβ", "οδος good"]
+    pd.testing.assert_frame_equal(run_instructions(tmp_path, dict_json, df, optimize="exact"), expected)
+
+
+# a checkpoint of a dataframe with lists is not resumed with another dataframe
+def test_checkpoint_of_other_dataframe(tmp_path, monkeypatch):
+    df = pd.DataFrame({"a": [["X", "Y"]] * 4, "b": ["One", "Two"] * 2})
+    other_df = pd.DataFrame({"a": [["Z"]] * 4, "b": ["Three", "Four"] * 2})
+    dict_json = {"b": {"LOWERCASE": {}}, "a": {"CONVERT_EMOJIS": {}}}
+    checkpoint_dir = str(tmp_path / "checkpoint")
+
+    # the first run stops after the first stage
+    original_run_stage = preprocessing_module.run_stage
+    def failing_run_stage(df_copy, columns_to_process, stage, execution):
+        if columns_to_process == ["a"]:
+            raise MemoryError
+        original_run_stage(df_copy, columns_to_process, stage, execution)
+    monkeypatch.setattr(preprocessing_module, "run_stage", failing_run_stage)
+    with pytest.raises(MemoryError):
+        run_instructions(tmp_path, dict_json, df, checkpoint_dir=checkpoint_dir)
+    monkeypatch.setattr(preprocessing_module, "run_stage", original_run_stage)
+
+    result = run_instructions(tmp_path, dict_json, other_df, checkpoint_dir=checkpoint_dir, resume=True)
+    pd.testing.assert_frame_equal(result, run_instructions(tmp_path, dict_json, other_df))
+
+
+# dates whose first texts have a day bigger than 12: the guessed format has the day first, the texts where the day and the
+# month could be swapped are read month first like dateutil, whatever the rows parsed together
+def test_dates_ambiguous_day_month(tmp_path):
+    texts = [f"{day}/{month:02d}/2019 10:30" for day in range(13, 29) for month in range(1, 13)][:150]
+    texts += ["05/06/2019 10:30", "01/02/2019 10:30", "13/01/2019 09:00", "06/06/2019 10:30"]
+    df = pd.DataFrame({"Time": texts})
+    expected = [convert_to_date_or_datetime(text) for text in texts]
+    assert expected[-4:-2] == [datetime.datetime(2019, 5, 6, 10, 30), datetime.datetime(2019, 1, 2, 10, 30)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert convert_to_date_or_datetime_texts(texts) == expected
+        assert convert_to_date_or_datetime_texts(texts[-4:]) == expected[-4:]
+    for options in [{}, {"workers": 2, "chunksize": 40}, {"dedup_ratio": 0}]:
+        result = run_instructions(tmp_path, {"Time": {"CONVERT_TO_DATE_OR_DATETIME": {}}}, df, **options)
+        assert result["Time"].tolist() == expected
+
+
+# apply the per-cell functions of instructions one after the other to each value
+def per_cell(values, dict_target):
+    functions = [cell_function(instruction, dict_instruction) for instruction, dict_instruction in dict_target.items()]
+    results = []
+    for value in values:
+        for function in functions:
+            value = function(value)
+        results.append(value)
+    return results
+
+
+# the vectorized instructions on an object column with NaN, numbers and lists give the per-cell results
+def test_vectorized_object_column(tmp_path):
+    values = ["Hello <b>World</b>!", float("nan"), "ΟΔΟΣ. :) www.site.com", None, 12.5, ["A", "B"], "ΑΣ!Β"] * 3
+    df = pd.DataFrame({"Review": values})
+    dict_target = {"REMOVE_HTML": {}, "REMOVE_URLS": {}, "LOWERCASE": {}, "REMOVE_PUNCT": {}, "REMOVE_EMOTICONS": {}, "REMOVE_EMOJI": {}}
+    modes = instruction_modes(build_plans({"Review": dict_target}), df)
+    assert set(modes.values()) == {"vectorized"}
+    result = run_instructions(tmp_path, {"Review": dict_target}, df)
+    assert result["Review"].tolist() == per_cell(values, dict_target)
+
+
+# the "exact" optimizer moves REMOVE_PUNCT (cheaper) before REMOVE_EMOJI, the result is the same
+def test_exact_optimizer_swap(tmp_path):
+    dict_target = {"REMOVE_EMOJI": {}, "REMOVE_PUNCT": {}, "REMOVE_STOPWORDS": {}}
+    assert list(optimize_instructions(dict_target, "exact").keys()) == ["REMOVE_PUNCT", "REMOVE_EMOJI", "REMOVE_STOPWORDS"]
+    df = pd.DataFrame({"Review": ["Great!\U0001F600food,✅ the best.", "no\U0001F680!emoji?", "a.\U0001F1EB\U0001F1F7.b", float("nan")] * 3})
+    expected = run_instructions(tmp_path, {"Review": dict_target}, df)
+    assert expected["Review"].tolist() == per_cell(df["Review"], dict_target)
+    pd.testing.assert_frame_equal(run_instructions(tmp_path, {"Review": dict_target}, df, optimize="exact"), expected)
+
+
+# compiling a plan downloads each nltk resource once and skips the instructions that are not applied to cells
+def test_build_plan_downloads_once(monkeypatch):
+    downloads = []
+    monkeypatch.setattr(preprocessing_module.nltk, "download", lambda resource, quiet=False: downloads.append(resource))
+    monkeypatch.setattr(preprocessing_module, "downloaded_resources", set())
+    plan = build_plans({"Review": {"LOWERCASE": {}, "REMOVE_STOPWORDS": {}, "STEM": {}, "REMOVE_STOPWORDS_1": {"language": "french"}}})[0][1]
+    assert downloads == ["stopwords"]
+    assert [stage["names"] for stage in plan] == [["LOWERCASE", "REMOVE_STOPWORDS", "STEM", "REMOVE_STOPWORDS_1"]]
+
+
+# first rows of the sample csv (the Review column has NaN cells)
+def sample_dataframe(nb_rows):
+    df = pd.read_csv(os.path.join(ROOT, "Restaurant reviews.csv"))
+    return df.head(nb_rows)
+
+
+# the pool of processes (chunks of chunksize cells) gives the result of a serial run and of the per-cell functions
+def test_workers_chunksize(tmp_path):
+    df = sample_dataframe(300)
+    dict_target = {"REMOVE_HTML": {}, "CONVERT_EMOJIS": {}, "LOWERCASE": {}, "REMOVE_PUNCT": {}, "CHAT_WORDS_CONVERSION": {}, "REMOVE_STOPWORDS": {}, "STEM": {}}
+    dict_json = {"COLUMNS;Review;Reviewer": dict_target, "Metadata": {"EXTRACT_REGEX_PATTERN": {"regex_pattern": "(\\d+) Review", "new_column_name": ["nb_review"], "result_type": "int"}}}
+    serial = run_instructions(tmp_path, dict_json, df)
+    for column in ["Review", "Reviewer"]:
+        assert serial[column].tolist() == per_cell(df[column], dict_target)
+    for options in [{"workers": 2}, {"workers": 2, "chunksize": 37}, {"workers": 3, "chunksize": 1000, "dedup_ratio": 0}]:
+        pd.testing.assert_frame_equal(run_instructions(tmp_path, dict_json, df, **options), serial)
+
+    # REMOVE_FREQUENT and REMOVE_RARE count the words of the chunks in the processes
+    dict_json = {"Review": {"LOWERCASE": {}, "REMOVE_FREQUENT": {"nb_words": 10, "apply": "-e"}, "REMOVE_RARE": {"nb_words": 50, "apply": "-e"}}}
+    serial = run_instructions(tmp_path, dict_json, df)
+    pd.testing.assert_frame_equal(run_instructions(tmp_path, dict_json, df, workers=2, chunksize=25), serial)
+
+
+# the csv file processed by chunks gives the file written from the whole dataframe, REMOVE_FREQUENT and REMOVE_RARE
+# count the words of all the chunks
+def test_preprocessing_csv(tmp_path):
+    input_file = tmp_path / "input.csv"
+    sample_dataframe(700).to_csv(input_file, index=False)
+    dict_json = {"Review": {"LOWERCASE": {}, "REMOVE_PUNCT": {}, "REMOVE_FREQUENT": {"nb_words": 5, "apply": "-e"}, "REMOVE_STOPWORDS": {}},
+                 "Metadata": {"EXTRACT_REGEX_PATTERN": {"regex_pattern": "(\\d+) Review", "new_column_name": ["nb_review"], "result_type": "int"}}}
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps(dict_json))
+
+    expected_file = tmp_path / "expected.csv"
+    preprocessing(str(instructions_file), pd.read_csv(input_file, dtype=str)).to_csv(expected_file, index=False)
+    for options in [{"rows_per_chunk": 150}, {"rows_per_chunk": 100, "workers": 2}]:
+        output_file = tmp_path / "output.csv"
+        preprocessing_csv(str(instructions_file), str(input_file), str(output_file), **options)
+        assert output_file.read_bytes() == expected_file.read_bytes()
+
+
+# the vectorized instructions on the Review column of the sample csv give the per-cell results
+def test_vectorized_sample_reviews(tmp_path):
+    df = sample_dataframe(2000)
+    dict_target = {"REMOVE_URLS": {}, "REMOVE_HTML": {}, "REMOVE_EMOTICONS": {}, "LOWERCASE": {}, "REMOVE_PUNCT": {"punctuation": "!?.,"}}
+    result = run_instructions(tmp_path, {"Review": dict_target}, df)
+    assert result["Review"].tolist() == per_cell(df["Review"], dict_target)
+
+
+# the rows changed, added and removed since the last run give the file written from a full preprocessing of the dataframe,
+# the words of REMOVE_FREQUENT are the ones counted by the first run
+def test_incremental_changed_rows(tmp_path):
+    df = sample_dataframe(200)
+    dict_json = {"Review": {"REMOVE_HTML": {}, "LOWERCASE": {}, "REMOVE_PUNCT": {}, "REMOVE_STOPWORDS": {}},
+                 "Metadata": {"EXTRACT_REGEX_PATTERN": {"regex_pattern": "(\\d+) Review", "new_column_name": ["nb_review"], "result_type": "int"}}}
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps(dict_json))
+    output_file = tmp_path / "output.csv"
+    key_columns = ["Restaurant", "Reviewer", "Time"]
+    preprocessing_incremental(str(instructions_file), df, str(output_file), key_columns=key_columns)
+
+    new_df = df.drop(index=range(10, 20)).copy()
+    new_df.loc[[0, 50, 199], "Review"] = ["Changed <b>REVIEW</b>!", float("nan"), "The end."]
+    new_df = pd.concat([new_df, sample_dataframe(230).iloc[200:]])
+    result = preprocessing_incremental(str(instructions_file), new_df, str(output_file), key_columns=key_columns)
+    assert len(result) == len(new_df)
+    expected_file = tmp_path / "expected.csv"
+    preprocessing(str(instructions_file), new_df).to_csv(expected_file, index=False)
+    assert output_file.read_bytes() == expected_file.read_bytes()
+
+    # the new rows keep the frequent words of the first run
+    instructions_file.write_text(json.dumps({"Review": {"LOWERCASE": {}, "REMOVE_FREQUENT": {"nb_words": 5, "apply": "-e"}}}))
+    preprocessing_incremental(str(instructions_file), df, str(output_file))
+    with open(str(output_file) + ".manifest.json", 'r') as json_file:
+        words_to_remove = list(json.load(json_file)["words_to_remove"].values())[0]["Review"]
+    assert len(words_to_remove) == 5
+    new_df = pd.concat([df, pd.DataFrame({"Review": [" ".join(words_to_remove + ["kept"])]}, index=[1000])])
+    result = preprocessing_incremental(str(instructions_file), new_df, str(output_file))
+    assert result["Review"].iloc[-1].split() == ["kept"]
+
+
+# the profiled run gives the result of the plain run, with one line of the report per target and instruction
+def test_profile_report(tmp_path):
+    df = sample_dataframe(300)
+    dict_json = {"Review": {"REMOVE_HTML": {}, "LOWERCASE": {}, "REMOVE_STOPWORDS": {}},
+                 "Metadata": {"EXTRACT_REGEX_PATTERN": {"regex_pattern": "(\\d+) Review", "new_column_name": ["nb_review"], "result_type": "int"}}}
+    expected = run_instructions(tmp_path, dict_json, df)
+    trace_file = tmp_path / "trace.json"
+    for options in [{}, {"workers": 2, "chunksize": 50}]:
+        result, report = run_instructions(tmp_path, dict_json, df, profile=True, trace_file=str(trace_file), **options)
+        pd.testing.assert_frame_equal(result, expected)
+        assert report[["target", "instruction"]].values.tolist() == [["Review", "REMOVE_HTML"], ["Review", "LOWERCASE"],
+                                                                     ["Review", "REMOVE_STOPWORDS"], ["Metadata", "EXTRACT_REGEX_PATTERN"]]
+        assert report["rows"].tolist() == [300] * 4
+        assert (report["seconds"] >= 0).all()
+        events = json.loads(trace_file.read_text())["traceEvents"]
+        assert [event["name"] for event in events if event["ph"] == "X"] == report["instruction"].tolist()
+
+
+# the format inferred on the Time column of the sample csv gives the dates of dateutil, with or without the format given
+def test_dates_sample_times(tmp_path):
+    df = sample_dataframe(3000)
+    texts = df["Time"].tolist() + ["not a date", "2019-05-25"]
+    assert infer_date_format(texts) == "%m/%d/%Y %H:%M"
+    expected = [convert_to_date_or_datetime(text) for text in texts]
+    assert convert_to_date_or_datetime_texts(texts) == expected
+    assert convert_to_date_or_datetime_texts(texts, "%m/%d/%Y %H:%M") == [convert_to_date_or_datetime_format(text, "%m/%d/%Y %H:%M") for text in texts]
+    for dict_instruction in [{}, {"format": "%m/%d/%Y %H:%M"}]:
+        result = run_instructions(tmp_path, {"Time": {"CONVERT_TO_DATE_OR_DATETIME": dict_instruction}}, df)
+        assert result["Time"].tolist() == per_cell(df["Time"], {"CONVERT_TO_DATE_OR_DATETIME": dict_instruction})
@@ -0,0 +1,102 @@
+import os
+import ast
+import json
+import random
+from collections import Counter
+import pandas as pd
+from sketches import MisraGries, CountMinSketch
+from preprocessing import preprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# words with a zipf-like distribution, added by batches
+def word_batches(nb_batches=20, batch_size=500, seed=0):
+    generator = random.Random(seed)
+    words = [f"w{i}" for i in range(2000)]
+    weights = [1 / (i + 1) for i in range(len(words))]
+    return [Counter(generator.choices(words, weights, k=batch_size)) for _ in range(nb_batches)]
+
+
+# the counts are under the real ones by at most the error, which is at most total / (capacity + 1)
+def test_misra_gries_error():
+    batches = word_batches()
+    counts = sum(batches, Counter())
+    sketch = MisraGries(100)
+    for batch in batches:
+        sketch.update(batch)
+    assert sketch.total == sum(counts.values())
+    assert 0 < sketch.error <= sketch.total / 101
+    assert len(sketch.counts) <= 100
+    for word, count in counts.items():
+        if count > sketch.error:
+            assert word in sketch.counts
+        assert count - sketch.error <= sketch.counts.get(word, 0) <= count
+    assert [word for word, count in sketch.most_common(5)] == [word for word, count in counts.most_common(5)]
+
+
+# a sketch merged from the sketches of two halves keeps the same bound
+def test_misra_gries_merge():
+    batches = word_batches()
+    counts = sum(batches, Counter())
+    first, second = MisraGries(100), MisraGries(100)
+    for batch in batches[:10]:
+        first.update(batch)
+    for batch in batches[10:]:
+        second.update(batch)
+    first.merge(second)
+    assert first.total == sum(counts.values())
+    assert first.error <= first.total / 101 * 2
+    for word, count in counts.items():
+        assert count - first.error <= first.counts.get(word, 0) <= count
+
+    # without reduction the counts are the exact ones
+    first, second = MisraGries(10000), MisraGries(10000)
+    first.update(batches[0])
+    second.update(batches[1])
+    first.merge(second)
+    assert first.counts == dict(batches[0] + batches[1]) and first.error == 0
+
+
+# the estimates are over the real counts, the rarest words are found among the candidates
+def test_count_min_sketch():
+    batches = word_batches()
+    counts = sum(batches, Counter())
+    sketch = CountMinSketch(width=5000, depth=4, capacity=5000)
+    for batch in batches[:10]:
+        sketch.update(batch)
+    other = CountMinSketch(width=5000, depth=4, capacity=5000)
+    for batch in batches[10:]:
+        other.update(batch)
+    sketch.merge(other)
+    assert sketch.total == sum(counts.values())
+    estimates = {word: sketch.estimate(word) for word in counts}
+    assert all(estimates[word] >= count for word, count in counts.items())
+    assert sum(estimates[word] - count <= sketch.error() for word, count in counts.items()) >= sketch.confidence() * len(counts)
+    assert sketch.estimate("unknown word") <= sketch.error()
+    least_common = sketch.least_common(10)
+    assert len(least_common) == 10 and all(estimate <= min(counts.values()) + sketch.error() for word, estimate in least_common)
+    assert [estimate for word, estimate in least_common] == sorted([estimate for word, estimate in least_common], reverse=True)
+
+    # with a table much wider than the number of words, the rarest words are the exact ones
+    sketch = CountMinSketch(width=1000000, depth=4, capacity=50)
+    sketch.update(Counter({"a": 5, "b": 1, "c": 3, "d": 2}))
+    sketch.update(Counter({"b": 1, "e": 7}))
+    assert sketch.least_common(3) == Counter({"a": 5, "b": 2, "c": 3, "d": 2, "e": 7}).most_common()[-3:]
+
+
+# the approximate mode prints the words of the exact mode on the sample csv and doesn't change the column
+def test_approximate_mode(tmp_path, capsys):
+    df = pd.read_csv(os.path.join(ROOT, "Restaurant reviews.csv")).head(2000)
+    instructions_file = tmp_path / "instructions.json"
+    outputs = {}
+    for mode in ["exact", "approximate"]:
+        instructions_file.write_text(json.dumps({"Review": {"LOWERCASE": {}, "REMOVE_FREQUENT": {"nb_words": 10, "mode": mode, "sketch_size": 1000}}}))
+        capsys.readouterr()
+        result = preprocessing(str(instructions_file), df)
+        pd.testing.assert_series_equal(result["Review"], df["Review"].str.lower())
+        lines = capsys.readouterr().out.splitlines()
+        position = [i for i, line in enumerate(lines) if line.startswith("Most frequent words")][0]
+        outputs[mode] = (lines[position], ast.literal_eval(lines[position + 1]))
+    assert "approximate" in outputs["approximate"][0]
+    assert [word for word, count in outputs["approximate"][1]] == [word for word, count in outputs["exact"][1]]
@@ -0,0 +1,76 @@
+import os
+import json
+import pickle
+import pytest
+import pandas as pd
+from spellchecker import SpellChecker
+import spelling
+from spelling import SymSpellChecker, edit_distance, INDEX_VERSION
+from preprocessing import preprocessing, correct_spellings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# index built once for the tests of the module, saved in a temporary file
+@pytest.fixture(scope="module")
+def index_file(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("spelling") / "spell_index.pkl")
+    SymSpellChecker.load_or_build(path)
+    return path
+
+
+# distance with insertions, deletions, substitutions and transpositions, max_distance + 1 when it is bigger
+def test_edit_distance():
+    assert edit_distance("speling", "spelling", 2) == 1
+    assert edit_distance("teh", "the", 2) == 1
+    assert edit_distance("abc", "abc", 2) == 0
+    assert edit_distance("kitten", "sitting", 2) == 3
+    assert edit_distance("a", "abcdef", 2) == 3
+
+
+# same corrections as pyspellchecker on misspelled words (the ties between words of the same frequency can differ)
+def test_symspell_corrections(index_file):
+    spell = SymSpellChecker.load_or_build(index_file)
+    reference = SpellChecker()
+    words = ["speling", "recieve", "teh", "restaurnt", "delicous", "ambience", "servise", "biryani", "12", "!", "good"]
+    for word in words:
+        assert spell.correction(word) == reference.correction(word)
+    assert spell.unknown(["Good", "Fod", "12"]) == reference.unknown(["Good", "Fod", "12"])
+
+
+# the index saved in the file is loaded without being built again, and built again if the file is from another version
+def test_symspell_reload(index_file, tmp_path, monkeypatch):
+    spell = SymSpellChecker.load_or_build(index_file)
+    def fail():
+        raise AssertionError("the index is built again")
+    monkeypatch.setattr(SymSpellChecker, "build", classmethod(lambda cls: fail()))
+    loaded = SymSpellChecker.load_or_build(index_file)
+    assert loaded.index == spell.index and loaded.frequencies == spell.frequencies
+
+    old_file = str(tmp_path / "old_index.pkl")
+    with open(old_file, 'wb') as file:
+        pickle.dump({"version": INDEX_VERSION - 1, "frequencies": {}, "index": {}}, file)
+    monkeypatch.setattr(SymSpellChecker, "build", classmethod(lambda cls: cls({"word": 1}, {"word": ["word"]})))
+    assert SymSpellChecker.load_or_build(old_file).frequencies == {"word": 1}
+    with open(old_file, 'rb') as file:
+        assert pickle.load(file)["version"] == INDEX_VERSION
+
+
+# without index_file, the index is saved in the cache directory of the user
+def test_symspell_default_index_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setattr(SymSpellChecker, "build", classmethod(lambda cls: cls({"word": 1}, {"word": ["word"]})))
+    SymSpellChecker.load_or_build()
+    assert os.path.isfile(spelling.default_index_file())
+    assert spelling.default_index_file().startswith(str(tmp_path))
+
+
+# SPELL_CORRECTION with symspell gives the corrections of correct_spellings applied to each cell, also in the processes
+def test_symspell_preprocessing(index_file, tmp_path):
+    df = pd.read_csv(os.path.join(ROOT, "Restaurant reviews.csv")).head(100)
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps({"Review": {"SPELL_CORRECTION": {"method": "symspell", "index_file": index_file}}}))
+    spell = SymSpellChecker.load_or_build(index_file)
+    expected = [correct_spellings(text, spell) for text in df["Review"]]
+    for options in [{}, {"workers": 2, "chunksize": 30}]:
+        assert preprocessing(str(instructions_file), df, **options)["Review"].tolist() == expected
@@ -0,0 +1,72 @@
+import os
+import json
+import pytest
+import pandas as pd
+from nltk.tokenize import word_tokenize
+from preprocessing import preprocessing, tokenize_text, is_whitespace_text, lemmatize_words_eng
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# the reviews after the instructions of instructions.json applied before LEMMATIZE_ENGLISH, the texts that the tokenizers
+# split on whitespace
+@pytest.fixture(scope="module")
+def whitespace_texts(tmp_path_factory):
+    with open(os.path.join(ROOT, "instructions.json"), 'r') as json_file:
+        dict_json = json.load(json_file)
+    instructions = list(dict_json["Review"].keys())
+    dict_review = {instruction: dict_json["Review"][instruction] for instruction in instructions[:instructions.index("LEMMATIZE_ENGLISH")]}
+    instructions_file = tmp_path_factory.mktemp("tokenizers") / "instructions.json"
+    instructions_file.write_text(json.dumps({"Review": dict_review}))
+
+    df = pd.read_csv(os.path.join(ROOT, "Restaurant reviews.csv"))
+    texts = [str(text) for text in preprocessing(str(instructions_file), df[["Review"]])["Review"]]
+    texts = [text for text in texts if is_whitespace_text(text)]
+    assert len(texts) > 0
+    return texts
+
+
+# same words as the treebank tokenizer of word_tokenize, without the sentence splitter (no punkt data needed)
+def test_whitespace_texts_treebank(whitespace_texts):
+    for text in whitespace_texts:
+        assert tokenize_text(text, "nltk") == word_tokenize(text, preserve_line=True)
+
+
+# same words as word_tokenize
+def test_whitespace_texts_word_tokenize(whitespace_texts):
+    try:
+        word_tokenize("Punkt. Data")
+    except LookupError:
+        pytest.skip("the punkt data of nltk is not installed")
+    for text in whitespace_texts:
+        assert tokenize_text(text, "nltk") == word_tokenize(text)
+
+
+# the regex tokenizer splits the contractions, the punctuation and the numbers like the treebank tokenizer, the whitespace
+# tokenizer only splits on spaces
+def test_regex_and_whitespace_tokenizers():
+    texts = ["I don't like it, it's bad.", "The food wasn't good!", "Price: 12.50 for 1,000 items", "Great food (really)", "we can't go"]
+    for text in texts:
+        assert tokenize_text(text, "regex") == word_tokenize(text, preserve_line=True)
+        assert tokenize_text(text, "whitespace") == text.split()
+    assert tokenize_text("we can't go", "whitespace") == ["we", "can't", "go"]
+
+
+# the argument tokenizer of LEMMATIZE_ENGLISH is checked
+def test_lemmatize_tokenizer_argument(tmp_path):
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps({"Review": {"LEMMATIZE_ENGLISH": {"tokenizer": "spacy"}}}))
+    with pytest.raises(SystemExit):
+        preprocessing(str(instructions_file), pd.DataFrame({"Review": ["Good food"]}))
+
+
+# LEMMATIZE_ENGLISH with the regex tokenizer gives the per-cell lemmatization with the same tokenizer
+def test_lemmatize_regex_tokenizer(tmp_path):
+    texts = ["The dishes were tasting great, didn't they?", "Cats are running (fast).", float("nan")] * 4
+    try:
+        expected = [lemmatize_words_eng(text, "regex") for text in texts]
+    except LookupError:
+        pytest.skip("the tagger or wordnet data of nltk is not installed")
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps({"Review": {"LEMMATIZE_ENGLISH": {"tokenizer": "regex"}}}))
+    assert preprocessing(str(instructions_file), pd.DataFrame({"Review": texts}))["Review"].tolist() == expected
@@ -0,0 +1,45 @@
+import os
+import json
+import string
+import pandas as pd
+from translation import CharacterTable
+from preprocessing import preprocessing, cell_function, characters_function, lowercase, remove_emoji, remove_punctuation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEXTS = ["Hello, World! \U0001F600", "ÀÉÎ ÕÜ ß İstanbul", "ΟΔΟΣ ΑΣ!Β σ", "a‍b \U0001F469‍\U0001F4BB \U0001F1EB\U0001F1F7 ✅",
+         "", "tab\tnew\nline 12.5%", "\U0001D400\U0001D401 ﬁ"]
+
+
+# the table applies the functions one after the other to each character
+def test_character_table():
+    functions = [lowercase, lambda text: remove_punctuation(text, string.punctuation), remove_emoji]
+    table = CharacterTable(functions)
+    for text in TEXTS:
+        if "Σ" not in text:
+            expected = text
+            for function in functions:
+                expected = function(expected)
+            assert text.translate(table) == expected
+    assert table[ord("!")] is None and table[ord("A")] == ord("a") and table[ord("İ")] == "i̇"
+
+
+# the consecutive character instructions (translation table for the whole column or per cell) give the per-cell results,
+# including the capital sigma lowercased with the characters around
+def test_character_instructions(tmp_path):
+    df = pd.read_csv(os.path.join(ROOT, "Restaurant reviews.csv")).head(2000)
+    df = pd.concat([df[["Review"]], pd.DataFrame({"Review": TEXTS + [float("nan"), 12]})], ignore_index=True)
+    dict_target = {"LOWERCASE": {}, "REMOVE_PUNCT": {"punctuation": "!?.,"}, "REMOVE_EMOJI": {}}
+    functions = [cell_function(instruction, dict_instruction) for instruction, dict_instruction in dict_target.items()]
+    expected = []
+    for value in df["Review"]:
+        for function in functions:
+            value = function(value)
+        expected.append(value)
+
+    translate_characters = characters_function([[instruction, instruction, dict_instruction] for instruction, dict_instruction in dict_target.items()])
+    assert [translate_characters(value) for value in df["Review"]] == expected
+    instructions_file = tmp_path / "instructions.json"
+    instructions_file.write_text(json.dumps({"Review": dict_target}))
+    for options in [{}, {"dedup_ratio": 0}, {"workers": 2, "chunksize": 500}]:
+        assert preprocessing(str(instructions_file), df, **options)["Review"].tolist() == expected
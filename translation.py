@@ -0,0 +1,36 @@
+"""
+Translation table of consecutive instructions that change each character of a text independently of the others
+(LOWERCASE, REMOVE_PUNCT, REMOVE_EMOJI), used by the plans of preprocessing.py.
+
+The table gives for the code point of a character the result of the instructions applied one after the other to this
+character alone (None when the character is removed), so text.translate(table) applies all of them in one pass. The
+results are computed the first time a character is seen and kept in the table, except the ascii characters which are
+computed at once: str.translate then uses its fast path on the ascii texts.
+
+Example Usage:
+table = CharacterTable([str.lower, remove_emoji])
+text.translate(table)
+"""
+
+
+class CharacterTable(dict):
+
+    def __init__(self, functions):
+        super().__init__()
+        self.functions = functions
+        for codepoint in range(128):
+            self[codepoint]
+
+    # result of the instructions for a character not seen yet
+    def __missing__(self, codepoint):
+        text = chr(codepoint)
+        for function in self.functions:
+            text = function(text)
+        if text == "":
+            value = None
+        elif len(text) == 1:
+            value = ord(text)
+        else:
+            value = text
+        self[codepoint] = value
+        return value